@@ -0,0 +1,314 @@
+import io
+import os
+import re
+import copy
+import html
+import json
+import itertools
+import threading
+import typing as t
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+GS_TIME_FMT = '%Y-%m-%d %H:%M:%S %z'
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def render(template: str, **values) -> str:
+    for key, value in values.items():
+        template = template.replace('{{' + key + '}}', str(value))
+    return template
+
+
+class FixtureSite:
+    """
+    Gradescope pages for `n_courses` courses with `n_assignments` assignments
+    each, rendered from the fixtures in `bench/fixtures`.
+    """
+
+    def __init__(self, n_courses: int, n_assignments: int,
+                 term: str = 'Fall', year: str = '2024', now: datetime = None) -> None:
+        self.n_courses = n_courses
+        self.n_assignments = n_assignments
+        self.term = term
+        self.year = year
+        self.now = now or datetime.now(timezone.utc)
+
+        self.course_ids = [str(100000 + i) for i in range(n_courses)]
+        self.login_page = load_fixture('login.html')
+        self.account_page = self._render_account()
+        self.course_pages = {cid: self._render_course(cid) for cid in self.course_ids}
+
+    def _render_account(self) -> str:
+        course_tmpl = load_fixture('account_course.html')
+        term_tmpl = load_fixture('account_term.html')
+        courses = ''.join(
+            render(course_tmpl, CID=cid, SHORTNAME=f'CS {i}', NAME=f'Course {i}', COUNT=self.n_assignments)
+            for i, cid in enumerate(self.course_ids))
+        # an older term the selection has to skip over
+        old_courses = render(course_tmpl, CID='1', SHORTNAME='OLD 1', NAME='Old course', COUNT=1)
+        terms = (render(term_tmpl, TERM=self.term, YEAR=self.year, COURSES=courses)
+                 + render(term_tmpl, TERM='Spring', YEAR='2020', COURSES=old_courses))
+        return render(load_fixture('account.html'), TERMS=terms)
+
+    def render_submission(self, cid: str, aid: str, sid: str) -> str:
+        # graded rows score 9.5 / 10.0, lost on the last of four questions
+        props = {
+            'assignment': {'id': int(aid), 'total_points': '10.0'},
+            'assignment_submission': {'id': int(sid), 'score': '9.5'},
+            'questions': [{'id': int(aid) * 10 + q, 'title': f'Question {q + 1}', 'weight': '2.5'}
+                          for q in range(4)],
+            'question_submissions': [{'question_id': int(aid) * 10 + q, 'score': '2.0' if q == 3 else '2.5'}
+                                     for q in range(4)],
+        }
+        return render(load_fixture('submission.html'), NAME=f'Submission {sid}',
+                      PROPS=html.escape(json.dumps(props)))
+
+    def _render_course(self, cid: str) -> str:
+        rows_tmpl = [load_fixture(f'course_row_{kind}.html') for kind in ('graded', 'submitted', 'unsubmitted')]
+        rows = []
+        for i in range(self.n_assignments):
+            # spread deadlines from two weeks ago to two months ahead
+            due = self.now + timedelta(days=-14 + (i * 7) % 75, hours=i % 24)
+            rows.append(render(
+                rows_tmpl[i % 3],
+                CID=cid, AID=str(5000000 + i), SID=str(9000000 + i), NAME=f'Homework {i}',
+                RELEASED=(due - timedelta(days=7)).strftime(GS_TIME_FMT),
+                DUE=due.strftime(GS_TIME_FMT),
+                LATE_DUE=(due + timedelta(days=2)).strftime(GS_TIME_FMT)))
+        return render(load_fixture('course.html'), CID=cid, SHORTNAME=f'CS {cid}',
+                      TERM=self.term, YEAR=self.year, ROWS=''.join(rows))
+
+
+class FakeGradescopeTransport(BaseAdapter):
+    """
+    requests transport adapter serving a `FixtureSite`; mount it on a
+    Gradescope session to run the scraper without network access.
+    """
+
+    COURSE_PATH = re.compile(r'^/courses/(\d+)$')
+    SUBMISSION_PATH = re.compile(r'^/courses/(\d+)/assignments/(\d+)/submissions/(\d+)$')
+
+    def __init__(self, site: FixtureSite) -> None:
+        super().__init__()
+        self.site = site
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs) -> requests.Response:
+        with self._lock:
+            self.requests += 1
+        path = requests.utils.urlparse(request.url).path or '/'
+
+        if request.method == 'POST' and path == '/login':
+            return self._response(request, 302, '', headers={'Location': 'https://www.gradescope.com/account'})
+        if path == '/':
+            return self._response(request, 200, self.site.login_page)
+        if path == '/account':
+            return self._response(request, 200, self.site.account_page)
+        if (m := self.COURSE_PATH.match(path)) and m.group(1) in self.site.course_pages:
+            return self._response(request, 200, self.site.course_pages[m.group(1)])
+        if (m := self.SUBMISSION_PATH.match(path)) and m.group(1) in self.site.course_pages:
+            return self._response(request, 200, self.site.render_submission(*m.groups()))
+        return self._response(request, 404, 'Not Found')
+
+    def _response(self, request, status, body: str, headers=None) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8', **(headers or {})})
+        response.raw = io.BytesIO(body.encode('utf-8'))     # read lazily, so streaming works too
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class _Request:
+    def __init__(self, fn) -> None:
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+class FakeTasksService:
+    """
+    In-process stand-in for the Google Tasks v1 service object built by
+    `googleapiclient.discovery.build`, covering the calls GSTaskClient makes.
+    Writes to fields the API treats as read-only are rejected, since the real
+    service silently ignores them.
+    """
+
+    READ_ONLY_FIELDS = frozenset(('assignmentInfo', 'deleted', 'hidden', 'kind', 'links', 'parent',
+                                  'position', 'selfLink', 'updated', 'webViewLink'))
+
+    def __init__(self) -> None:
+        self.tasklists_by_id: t.Dict[str, dict] = {}
+        self.tasks_by_list: t.Dict[str, t.Dict[str, dict]] = {}
+        self.calls: t.Dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _now(self) -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    def tasklists(self):
+        return _Tasklists(self)
+
+    def tasks(self):
+        return _Tasks(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+
+class _Tasklists:
+    def __init__(self, service: FakeTasksService) -> None:
+        self.service = service
+
+    def list(self, maxResults=100, pageToken=None, **kwargs):
+        def run():
+            self.service._count('tasklists.list')
+            return {'items': copy.deepcopy(list(self.service.tasklists_by_id.values()))}
+        return _Request(run)
+
+    def insert(self, body):
+        def run():
+            self.service._count('tasklists.insert')
+            lid = f'list{next(self.service._ids)}'
+            tasklist = {'kind': 'tasks#taskList', 'id': lid, 'title': body['title'],
+                        'etag': f'"{lid}"', 'updated': self.service._now()}
+            self.service.tasklists_by_id[lid] = tasklist
+            self.service.tasks_by_list[lid] = {}
+            return copy.deepcopy(tasklist)
+        return _Request(run)
+
+
+def _check_writable(body: dict) -> None:
+    if (read_only := sorted(FakeTasksService.READ_ONLY_FIELDS & set(body))):
+        raise ValueError(f'read-only task fields in request body: {read_only}')
+
+
+class _Tasks:
+    def __init__(self, service: FakeTasksService) -> None:
+        self.service = service
+
+    def list(self, tasklist, maxResults=100, pageToken=None, fields=None, showDeleted=False,
+             updatedMin=None, dueMin=None, dueMax=None, **kwargs):
+        def run():
+            self.service._count('tasks.list')
+            items = list(self.service.tasks_by_list[tasklist].values())
+            if not showDeleted:
+                items = [i for i in items if not i.get('deleted')]
+            if updatedMin:
+                items = [i for i in items if i['updated'] >= updatedMin.replace('+00:00', 'Z')]
+            if dueMax:
+                items = [i for i in items if i.get('due') and i['due'] <= dueMax.replace('+00:00', 'Z')]
+            start = int(pageToken or 0)
+            page = {'items': copy.deepcopy(items[start:start + maxResults])}
+            if start + maxResults < len(items):
+                page['nextPageToken'] = str(start + maxResults)
+            return page
+        return _Request(run)
+
+    def insert(self, tasklist, body):
+        def run():
+            self.service._count('tasks.insert')
+            _check_writable(body)
+            tid = f'task{next(self.service._ids)}'
+            task = {**body, 'kind': 'tasks#task', 'id': tid, 'etag': f'"{tid}-0"', 'updated': self.service._now()}
+            self.service.tasks_by_list[tasklist][tid] = task
+            return copy.deepcopy(task)
+        return _Request(run)
+
+    def patch(self, tasklist, task, body):
+        def run():
+            self.service._count('tasks.patch')
+            _check_writable(body)
+            stored = self.service.tasks_by_list[tasklist][task]
+            stored.update(body)
+            stored['updated'] = self.service._now()
+            stored['etag'] = f'"{task}-{stored["updated"]}"'
+            return copy.deepcopy(stored)
+        return _Request(run)
+
+    def delete(self, tasklist, task):
+        def run():
+            self.service._count('tasks.delete')
+            stored = self.service.tasks_by_list[tasklist][task]
+            stored['deleted'] = True
+            stored['updated'] = self.service._now()
+            return ''
+        return _Request(run)
+
+
+class _Batch:
+    def __init__(self, service: FakeTasksService, callback) -> None:
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request, callback or self.callback))
+
+    def execute(self):
+        self.service._count('batch')
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeWebhook:
+    """
+    Stand-in for the Discord webhook endpoint, usable in place of the
+    `requests` module for `discord.post_embeds` and `discord.edit_embeds`.
+    """
+
+    def __init__(self) -> None:
+        self.posts: t.List[dict] = []
+        self.patches: t.List[dict] = []
+        self.messages: t.Dict[str, dict] = {}
+        self._ids = itertools.count(1)
+
+    def post(self, url, json=None, params=None, **kwargs) -> requests.Response:
+        self.posts.append(json)
+        message_id = str(next(self._ids))
+        self.messages[message_id] = json
+        response = requests.Response()
+        if params and params.get('wait') == 'true':
+            response.status_code = 200
+            response._content = f'{{"id": "{message_id}"}}'.encode()   # `json` is the body here
+        else:
+            response.status_code = 204
+            response._content = b''
+        return response
+
+    def patch(self, url, json=None, **kwargs) -> requests.Response:
+        message_id = urlsplit(url).path.rsplit('/', 1)[-1]
+        response = requests.Response()
+        response._content = b''
+        if message_id not in self.messages:
+            response.status_code = 404
+            return response
+        self.patches.append(json)
+        self.messages[message_id] = json
+        response.status_code = 200
+        return response
@@ -0,0 +1,102 @@
+"""
+Equivalence check of the HTML parser backends.
+
+Every page rendered from `bench/fixtures` (dashboard, course pages covering
+each row kind, graded submission) is scraped with the baseline, `html.parser`
+building whole pages, and with `html.parser` and lxml, each with and without
+the strainers. Course pages are also streamed through `iter_assignments`,
+whose lxml row extraction is separate from the tree parsers'. The scraped
+`Course`, `Assignment` and `SubmissionResult` fields must be identical. Run
+from the repository root:
+
+    python -m bench.parsers [--courses 3] [--assignments 12]
+
+Exits with status 1 and lists the differing fields when a backend disagrees.
+"""
+import sys
+import argparse
+import typing as t
+
+import requests
+
+from gradescope.course import CourseClient, CourseFilter
+from gradescope.assignment import AssignmentClient, Assignment
+from gradescope.submission import SubmissionClient, needs_fetch
+from gradescope.html_parser import ParserBackend
+
+from bench.fakes import FixtureSite, FakeGradescopeTransport
+
+BASELINE = ParserBackend('html.parser', strain=False)
+BACKENDS = (
+    ParserBackend('html.parser', strain=True),
+    ParserBackend('lxml', strain=False),
+    ParserBackend('lxml', strain=True),
+)
+
+
+def scrape(site: FixtureSite, parser: ParserBackend, stream: bool = False) -> t.Dict[str, t.Any]:
+    """
+    The fields scraped from every page of `site`, keyed by page and object.
+    With `stream`, course pages are read through `iter_assignments` instead.
+    """
+    fields = {}
+
+    courses = CourseClient(parser=parser)._parse_courses(site.account_page)
+    filtered = CourseClient(parser=parser)._parse_courses(site.account_page, CourseFilter(site.term, site.year))
+    for label, result in (('account', courses), ('account?filter', filtered)):
+        for cid, course in result.student_courses.items():
+            fields[f'{label} course {cid}'] = {k: getattr(course, k) for k in course.__slots__}
+
+    session = requests.Session()
+    session.mount('https://', FakeGradescopeTransport(site))
+    graded = []
+    for cid, html in site.course_pages.items():
+        client = AssignmentClient(session, parser=parser)
+        assignments = client.iter_assignments(cid) if stream else client._parse_assignments(cid, html).assignments
+        for a in assignments:
+            fields[f'course {cid} assignment {a.aid}'] = {k: getattr(a, k) for k in Assignment.__slots__}
+            if needs_fetch(a):
+                graded.append(a)
+
+    submissions = SubmissionClient(parser=parser)
+    for a in graded:
+        html = site.render_submission(a.cid, a.aid, a.submission_id)
+        fields[f'submission {a.submission_id}'] = submissions._parse_submission(a, html).to_dict()
+    return fields
+
+
+def compare(expected: t.Dict[str, t.Any], actual: t.Dict[str, t.Any]) -> t.List[str]:
+    diffs = []
+    for key in sorted(expected.keys() | actual.keys()):
+        if key not in actual:
+            diffs.append(f'{key}: missing')
+        elif key not in expected:
+            diffs.append(f'{key}: unexpected')
+        elif expected[key] != actual[key]:
+            changed = [f for f in expected[key] if expected[key][f] != actual[key].get(f)]
+            diffs.append(f'{key}: {", ".join(changed)} differ')
+    return diffs
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Check that all parser backends scrape the same fields.')
+    parser.add_argument('--courses', type=int, default=3)
+    parser.add_argument('--assignments', type=int, default=12)
+    args = parser.parse_args(argv)
+
+    site = FixtureSite(args.courses, args.assignments)
+    expected = scrape(site, BASELINE)
+    failed = False
+    runs = [(str(backend), scrape(site, backend)) for backend in BACKENDS]
+    runs.append(('streaming iter_assignments', scrape(site, BACKENDS[-1], stream=True)))
+    for label, actual in runs:
+        diffs = compare(expected, actual)
+        print(f'{label}: {len(expected)} objects, {len(diffs)} differences')
+        for diff in diffs:
+            print(f'  {diff}')
+        failed |= bool(diffs)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
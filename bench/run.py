@@ -0,0 +1,222 @@
+"""
+Offline benchmarks of a sync cycle.
+
+Gradescope pages are rendered from `bench/fixtures` and served through a fake
+transport; Google Tasks and the Discord webhook are in-process stand-ins.
+Run from the repository root:
+
+    python -m bench.run [--scales 5x2,50x10,500x10] [--repeat 3] [--output bench.json]
+
+Each scale is COURSESxASSIGNMENTS_PER_COURSE. Results are written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import statistics
+import typing as t
+import logging as log
+from datetime import datetime, timezone
+
+from gradescope.gradescope import Gradescope
+from gradescope.course import CourseClient, CourseFilter
+from gradescope.assignment import AssignmentClient
+from gradescope.html_parser import default_backend
+from gradescope.rate_limit import RateLimiter
+from gradescope.parse_pool import ParsePool
+from task.task import GSTaskClient
+from task.sync import sync_tasks, assignment_to_task
+from pipeline.pipeline import Pipeline
+from pipeline.sinks import GoogleTasksSink, DiscordSink
+
+from bench.fakes import FixtureSite, FakeGradescopeTransport, FakeTasksService, FakeWebhook
+
+DEFAULT_SCALES = ((5, 2), (50, 10), (500, 10))
+
+
+def timed(fn: t.Callable[[], t.Any], repeat: int) -> t.Tuple[t.List[float], t.Any]:
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return timings, result
+
+
+def summarize(name: str, scale: dict, timings: t.List[float], items: int = None, **extra) -> dict:
+    record = {
+        'name': name,
+        'scale': scale,
+        'repeat': len(timings),
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'mean_s': statistics.mean(timings),
+        **extra,
+    }
+    if items:
+        record['items'] = items
+        record['items_per_s'] = items / record['median_s'] if record['median_s'] else None
+    return record
+
+
+def make_gradescope(site: FixtureSite) -> t.Tuple[Gradescope, FakeGradescopeTransport]:
+    # the fake transport needs no throttling, keep the limiter out of the timings
+    gs = Gradescope('bench@example.com', 'password', rate_limiter=RateLimiter(rate=1e9, burst=10 ** 9))
+    transport = FakeGradescopeTransport(site)
+    gs.session.mount('https://', transport)
+    return gs, transport
+
+
+def make_task_client(service: FakeTasksService) -> GSTaskClient:
+    client = GSTaskClient(client_secret_file=None, token_file=None, tasklist_name='gs_deadlines')
+    client.service = service
+    client.init_tasklist()
+    return client
+
+
+def bench_scale(n_courses: int, n_assignments: int, repeat: int) -> t.List[dict]:
+    scale = {'courses': n_courses, 'assignments_per_course': n_assignments,
+             'assignments': n_courses * n_assignments}
+    site = FixtureSite(n_courses, n_assignments)
+    results = []
+
+    # scraping without the response cache, so every run parses
+    gs, _ = make_gradescope(site)
+    gs.login()
+
+    timings, courses = timed(lambda: CourseClient(gs.session).get_courses(), repeat)
+    results.append(summarize('get_courses', scale, timings, items=len(courses.student_courses)))
+
+    course_id = site.course_ids[0]
+    timings, res = timed(lambda: AssignmentClient(gs.session).get_assignments(course_id), repeat)
+    results.append(summarize('get_assignments', scale, timings, items=len(res.assignments)))
+
+    # streaming: time to the first assignment and to the whole page
+    client = AssignmentClient(gs.session)
+    timings, _ = timed(lambda: next(client.iter_assignments(course_id)), repeat)
+    results.append(summarize('iter_assignments_first', scale, timings))
+    timings, _ = timed(lambda: sum(1 for _ in client.iter_assignments(course_id)), repeat)
+    results.append(summarize('iter_assignments', scale, timings, items=len(res.assignments)))
+
+    html = site.course_pages[course_id]
+    client = AssignmentClient(gs.session)
+    timings, _ = timed(lambda: client._parse_assignments(course_id, html), repeat)
+    results.append(summarize('parse_assignments', scale, timings, items=len(res.assignments)))
+
+    all_assignments = [a for r in gs.get_assignments_many(site.course_ids) for a in r.assignments]
+    timings, _ = timed(lambda: [assignment_to_task(a, 'CS') for a in all_assignments], repeat)
+    results.append(summarize('assignment_to_task', scale, timings, items=len(all_assignments)))
+
+    # graded results per question: the first run fetches every graded submission, later runs none
+    gs, transport = make_gradescope(site)
+    cycle = lambda: gs.get_submission_results(all_assignments, per_question=True)
+    timings, graded = timed(cycle, 1)
+    results.append(summarize('submission_results_cold', scale, timings, items=len(graded),
+                             gradescope_requests=transport.requests))
+    transport.requests = 0
+    timings, _ = timed(cycle, repeat)
+    results.append(summarize('submission_results_steady', scale, timings, items=len(graded),
+                             gradescope_requests=transport.requests))
+
+    # every course at once without the response cache, parsing in the fetch threads vs. a process pool
+    gs, _ = make_gradescope(site)
+    gs.response_cache = None
+    timings, _ = timed(lambda: gs.get_assignments_many(site.course_ids), repeat)
+    results.append(summarize('get_assignments_many', scale, timings, items=len(all_assignments)))
+    with ParsePool() as pool:
+        gs.parse_pool = pool
+        gs.get_assignments(course_id)   # start the workers outside the timings
+        timings, _ = timed(lambda: gs.get_assignments_many(site.course_ids), repeat)
+    results.append(summarize('get_assignments_many_parse_pool', scale, timings, items=len(all_assignments),
+                             parse_processes=pool.max_workers))
+
+    # full google_task cycle: first cycle fills an empty tasklist, later cycles are steady state
+    service = FakeTasksService()
+    gs, transport = make_gradescope(site)
+    cycle = lambda: sync_tasks(gs, make_client=lambda: make_task_client(service),
+                               term=site.term, year=site.year)
+    timings, _ = timed(cycle, 1)
+    results.append(summarize('google_task_cycle_cold', scale, timings,
+                             gradescope_requests=transport.requests, tasks_calls=dict(service.calls)))
+    service.calls.clear()
+    transport.requests = 0
+    timings, _ = timed(cycle, repeat)
+    results.append(summarize('google_task_cycle_steady', scale, timings,
+                             gradescope_requests=transport.requests, tasks_calls=dict(service.calls)))
+
+    # full discord digest cycle
+    import discord
+    os.environ.setdefault('COURSES_TERM', site.term)
+    os.environ.setdefault('COURSES_YEAR', site.year)
+    os.environ.setdefault('WEBHOOK_URL', 'https://discord.com/api/webhooks/0/bench')
+    webhook = FakeWebhook()
+    gs, transport = make_gradescope(site)
+    timings, _ = timed(lambda: discord.main(gs, http=webhook), repeat)
+    results.append(summarize('discord_cycle', scale, timings,
+                             gradescope_requests=transport.requests, webhook_posts=len(webhook.posts)))
+
+    # digest mode: the first run posts, unchanged runs send nothing
+    webhook = FakeWebhook()
+    gs, transport = make_gradescope(site)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = discord.DigestStore(os.path.join(tmp, 'digest.json'))
+        timings, _ = timed(lambda: discord.main(gs, http=webhook, store=store), repeat)
+    results.append(summarize('discord_digest_cycle', scale, timings, gradescope_requests=transport.requests,
+                             webhook_posts=len(webhook.posts), webhook_edits=len(webhook.patches)))
+
+    # one scrape per cycle feeding both Google Tasks and the Discord digest
+    service = FakeTasksService()
+    webhook = FakeWebhook()
+    gs, transport = make_gradescope(site)
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = Pipeline(gs, CourseFilter(site.term, site.year), [
+            GoogleTasksSink(lambda: make_task_client(service)),
+            DiscordSink(os.environ['WEBHOOK_URL'], discord.DigestStore(os.path.join(tmp, 'digest.json')),
+                        http=webhook)])
+        timings, sinks = timed(pipeline.run_once, repeat)
+    results.append(summarize('pipeline_cycle', scale, timings, gradescope_requests=transport.requests,
+                             tasks_calls=dict(service.calls), webhook_posts=len(webhook.posts),
+                             webhook_edits=len(webhook.patches),
+                             sink_seconds={r.sink: round(r.seconds, 6) for r in sinks}))
+
+    return results
+
+
+def parse_scales(value: str) -> t.List[t.Tuple[int, int]]:
+    return [tuple(int(x) for x in scale.split('x')) for scale in value.split(',')]
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description='Offline sync cycle benchmarks.')
+    parser.add_argument('--scales', type=parse_scales, default=DEFAULT_SCALES,
+                        help='comma-separated COURSESxASSIGNMENTS_PER_COURSE, e.g. 5x2,50x10')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='file to write the JSON report to, stdout if omitted')
+    args = parser.parse_args(argv)
+
+    log.basicConfig(level=log.WARNING)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'html_parser': default_backend.features,
+        'results': [],
+    }
+    for n_courses, n_assignments in args.scales:
+        report['results'].extend(bench_scale(n_courses, n_assignments, args.repeat))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return report
+
+
+if __name__ == '__main__':
+    main()
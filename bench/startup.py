@@ -0,0 +1,137 @@
+"""
+Cold start benchmarks, each measured in a fresh interpreter.
+
+- `import:<module>`: time to import an entry point module
+- `first_request:discord`: interpreter start to the first Gradescope request of
+  a `discord.py` run, served by the fake transport
+- `tasks_service`: interpreter start to a built Google Tasks service object
+
+Run from the repository root:
+
+    python -m bench.startup [--repeat 5] [--budget-ms 1000] [--output startup.json]
+
+Exits with status 1 when a Gradescope-only entry point imports the Google
+client stack and, with `--budget-ms`, when the median cold start to the first
+request exceeds the budget.
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+# entry points that scrape Gradescope and must not load the Google client stack on import
+GOOGLE_FREE_MODULES = ('discord', 'task.sync', 'runner.runner')
+GOOGLE_PACKAGES = ('googleapiclient', 'google_auth_oauthlib', 'google.oauth2')
+
+IMPORT_SCRIPT = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'google': sorted(m for m in sys.modules if m.startswith({google!r})),
+}}))
+"""
+
+FIRST_REQUEST_SCRIPT = """
+import sys, time, json
+spawned = float(sys.argv[1])
+import os
+os.environ.setdefault('COURSES_TERM', 'Fall')
+os.environ.setdefault('COURSES_YEAR', '2024')
+os.environ.setdefault('WEBHOOK_URL', 'https://discord.com/api/webhooks/0/bench')
+import discord
+from bench.fakes import FixtureSite, FakeGradescopeTransport
+
+class FirstRequest(Exception):
+    pass
+
+class Transport(FakeGradescopeTransport):
+    def send(self, request, **kwargs):
+        raise FirstRequest()
+
+gs = discord.Gradescope('bench@example.com', 'password')
+gs.session.mount('https://', Transport(FixtureSite(1, 1)))
+try:
+    discord.main(gs)
+except FirstRequest:
+    print(json.dumps({'seconds': time.time() - spawned}))
+"""
+
+TASKS_SERVICE_SCRIPT = """
+import sys, time, json
+spawned = float(sys.argv[1])
+from task.task import build_service
+from google.oauth2.credentials import Credentials
+build_service(Credentials(token='bench'))
+print(json.dumps({'seconds': time.time() - spawned}))
+"""
+
+
+def run_script(script: str, *args: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', script, *args],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(name: str, script: str, repeat: int, spawn_time: bool = False) -> dict:
+    timings, extra = [], {}
+    for _ in range(repeat):
+        result = run_script(script, str(time.time())) if spawn_time else run_script(script)
+        timings.append(result.pop('seconds'))
+        extra = result
+    return {
+        'name': name,
+        'repeat': repeat,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        **extra,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Cold start benchmarks.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float,
+                        help='fail when the median cold start to the first request exceeds this')
+    parser.add_argument('--output', help='file to write the JSON report to, stdout if omitted')
+    args = parser.parse_args(argv)
+
+    # warm the bytecode caches so the first sample is not an outlier
+    run_script(IMPORT_SCRIPT.format(module='discord', google=GOOGLE_PACKAGES))
+
+    results = [measure(f'import:{module}', IMPORT_SCRIPT.format(module=module, google=GOOGLE_PACKAGES),
+                       args.repeat)
+               for module in GOOGLE_FREE_MODULES]
+    first_request = measure('first_request:discord', FIRST_REQUEST_SCRIPT, args.repeat, spawn_time=True)
+    results.append(first_request)
+    results.append(measure('tasks_service', TASKS_SERVICE_SCRIPT, args.repeat, spawn_time=True))
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    failures = [f'{r["name"]} imports {", ".join(r["google"])}' for r in results if r.get('google')]
+    if args.budget_ms is not None and first_request['median_s'] * 1000 > args.budget_ms:
+        failures.append(f'cold start to first request took {first_request["median_s"] * 1000:.0f}ms, '
+                        f'budget is {args.budget_ms:.0f}ms')
+    for failure in failures:
+        sys.stderr.write(f'startup budget: {failure}\n')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
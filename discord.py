@@ -1,12 +1,17 @@
 import os
+import json
+import hashlib
 import requests
+import logging as log
 from dotenv import load_dotenv
 from datetime import timezone, timedelta, datetime as dt
+from urllib.parse import urlsplit, urlunsplit
 import typing as t
 
-from gradescope.course import Course
+from gradescope.course import Course, CourseFilter
 from gradescope.gradescope import Gradescope
-from gradescope.assignment import Assignment, SubmissionStatus as SubStatus
+from gradescope.atomic_file import atomic_write
+from gradescope.assignment import Assignment, GetAssignmentsResult, SubmissionStatus as SubStatus
 
 GRADESCOPE_BASE_URL = 'https://www.gradescope.com'
 
@@ -20,51 +25,42 @@ def parse_course_envstring(courses_str: str) -> set:
         return set()
     return set(courses_str.split(','))
 
-if __name__ == '__main__':
-
-    embeds = []
-
-    gs = Gradescope(
-        username=os.getenv('USERNAME'),
-        password=os.getenv('PASSWORD'))
-    
-    student_courses: t.List[Course] = gs.get_courses().student_courses
-
+def course_filter_from_env() -> CourseFilter:
+    """
+    Courses of the term and year set in environment variables, narrowed by
+    the included/excluded course IDs.
+    """
     term, year = os.getenv('COURSES_TERM'), os.getenv('COURSES_YEAR')
     assert (term is not None) and (year is not None), "Must define term and year in env file"
-     
-    selected_courses = list(filter(
-        lambda course: course.term == term and course.year == year,
-            student_courses.values()))
-    
-    inc_courses = parse_course_envstring(os.getenv('COURSES_TO_INCLUDE'))
-    if inc_courses:
-        selected_courses = filter(lambda course: course.cid in inc_courses, selected_courses)
-    
-    exc_courses = parse_course_envstring(os.getenv('COURSES_TO_EXCLUDE'))
-    if exc_courses:
-        selected_courses = filter(lambda course: course.cid not in exc_courses, selected_courses)
 
+    return CourseFilter(
+        term, year,
+        include=parse_course_envstring(os.getenv('COURSES_TO_INCLUDE')),
+        exclude=parse_course_envstring(os.getenv('COURSES_TO_EXCLUDE')))
+
+def build_embeds(gs: Gradescope, selected_courses: t.List[Course]) -> t.List[dict]:
+    results = gs.get_assignments_many([course.cid for course in selected_courses])
+    return render_embeds(zip(selected_courses, results))
+
+def render_embeds(course_results: t.Iterable[t.Tuple[Course, GetAssignmentsResult]]) -> t.List[dict]:
     # non-past due assignments, submitted vs unsubmitted
     # past due assignments
 
-    past_due = ''
+    past_due = []
     todue_list, todue_fields = [], []
     due_count, due_today_count = 0, 0
     nextdue_assign, nextdue_url, nextdue_crs, nextdue_dt = None, None, None, None
 
-    for course in selected_courses:
-        res = gs.get_assignments(course.cid)
+    for course, res in course_results:
+        if res.error:
+            log.warning(f'Failed to get assignments: course={course.shortname} error={res.error!r}')
+            continue
         assignments = res.assignments
         assignments_with_dt = []
-        
-        for assgn in assignments:
-            due_datetime, late_due_datetime = None, None
 
-            if assgn.due_time:
-                due_datetime = gs.to_datetime_object(assgn.due_time)
-            if assgn.late_due_time:
-                late_due_datetime = gs.to_datetime_object(assgn.late_due_time)
+        for assgn in assignments:
+            # datetimes are parsed once when the course is scraped
+            due_datetime, late_due_datetime = assgn.due_at, assgn.late_due_at
 
             # only keep assignments with due date.
             # exam is an example of assginment with no due date.  
@@ -75,7 +71,7 @@ if __name__ == '__main__':
         sorted_assignments = sorted(assignments_with_dt, key=lambda x: x[1])
 
         now = dt.now(timezone.utc)
-        todue_str = ''
+        todue_parts = []
 
         for assgn_with_dt in sorted_assignments:
 
@@ -110,32 +106,33 @@ if __name__ == '__main__':
                 else:
                     submission_emoji = '✅'
 
-                todue_str += '\n{} [{}]({})\nDue: {} \nLate Due: {}\n'.format(
-                    submission_emoji, assgn.name, assgn_url, due, late_due)
-                
+                todue_parts.append('\n{} [{}]({})\nDue: {} \nLate Due: {}\n'.format(
+                    submission_emoji, assgn.name, assgn_url, due, late_due))
+
                 if now + timedelta(days=1) > due_dt:
                     due_today_count += 1
                 due_count += 1
-                
+
             else:
                 # past due assignments
                 if assgn.submission_status == SubStatus.UNSUBMITTED:
-                    past_due += '- [{}]({}) - {} {}\n'.format(
-                        assgn.name, assgn_url, course.shortname, due_dt)
+                    past_due.append('- [{}]({}) - {} {}\n'.format(
+                        assgn.name, assgn_url, course.shortname, due_dt))
 
-        if todue_str:
-            todue_fields.append({'name': course.shortname, 'value': todue_str, 'inline': True})
+        if todue_parts:
+            todue_fields.append({'name': course.shortname, 'value': ''.join(todue_parts), 'inline': True})
 
     todue_desc = '## Summary\n- Total: **{}**\n- Due Today: **{}**\n'.format(due_count, due_today_count)
     if nextdue_assign:
         todue_desc += '- Next due: **[{}]({}) ({}) <t:{}:R>**'.format(
             nextdue_assign, nextdue_url, nextdue_crs, int(nextdue_dt.timestamp()))
-        
+
+    embeds = []
     embeds.append({
         'title': 'Missing Submission',
         'type': 'rich',
         'color': 0xFF3131,
-        'description': past_due if past_due else 'No missing submission! 💯',
+        'description': ''.join(past_due) if past_due else 'No missing submission! 💯',
     })
 
     embeds.append({
@@ -146,13 +143,125 @@ if __name__ == '__main__':
         'description': todue_desc,
     })
 
-    req = requests.post(
-        url=os.getenv('WEBHOOK_URL'),
-        json={
-            'username': 'Gradescope',
-            'avatar_url': '',
-            'embeds': embeds
-        })
-    
+    return embeds
+
+def make_payload(embeds: t.List[dict]) -> dict:
+    return {
+        'username': 'Gradescope',
+        'avatar_url': '',
+        'embeds': embeds
+    }
+
+def fingerprint(payload: dict) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def post_embeds(embeds: t.List[dict], webhook_url: str, http=requests, wait: bool = False) -> requests.Response:
+    '''
+    Post the embeds as a new message. With `wait` Discord answers with the
+    created message, whose id is needed to edit it later.
+    '''
+    req = http.post(
+        url=webhook_url,
+        params={'wait': 'true'} if wait else None,
+        json=make_payload(embeds))
+
     if req.status_code != 204:  # normal status code
-        req.raise_for_status()
\ No newline at end of file
+        req.raise_for_status()
+
+    return req
+
+def edit_embeds(embeds: t.List[dict], webhook_url: str, message_id: str, http=requests) -> requests.Response:
+    '''
+    Replace the embeds of a message previously sent through the webhook.
+    '''
+    url = urlsplit(webhook_url)
+    message_url = urlunsplit(url._replace(path=f'{url.path.rstrip("/")}/messages/{message_id}'))
+    # username/avatar can't be changed on an existing message
+    return http.patch(url=message_url, json={'embeds': embeds})
+
+class DigestStore:
+    '''
+    Remembers, per webhook, the id and fingerprint of the last digest message
+    so unchanged digests are not sent again and changed ones edit it in place.
+    Webhook URLs embed their token, so entries are keyed by a hash of the URL.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._digests: t.Dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._digests = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning(f'Failed to load digest state from {path}: {e!r}')
+
+    @staticmethod
+    def _key(webhook_url: str) -> str:
+        return hashlib.sha256(webhook_url.encode()).hexdigest()
+
+    def get(self, webhook_url: str) -> t.Tuple[t.Optional[str], t.Optional[str]]:
+        '''(message id, fingerprint) of the last digest sent to the webhook.'''
+        digest = self._digests.get(self._key(webhook_url), {})
+        return digest.get('message_id'), digest.get('fingerprint')
+
+    def put(self, webhook_url: str, message_id: str, fingerprint: str) -> None:
+        self._digests[self._key(webhook_url)] = {'message_id': message_id, 'fingerprint': fingerprint}
+        atomic_write(self.path, json.dumps(self._digests))
+
+def publish_digest(embeds: t.List[dict], webhook_url: str, store: DigestStore, http=requests) -> str:
+    '''
+    Bring the webhook's digest message up to date: nothing is sent when the
+    embeds are unchanged, otherwise the previous message is edited, or a new
+    one posted when there is none (or it was deleted).
+    Returns 'unchanged', 'edited' or 'posted'.
+    '''
+    message_id, last_fingerprint = store.get(webhook_url)
+    current = fingerprint(make_payload(embeds))
+
+    if message_id and current == last_fingerprint:
+        return 'unchanged'
+
+    if message_id:
+        req = edit_embeds(embeds, webhook_url, message_id, http=http)
+        if req.status_code != 404:
+            req.raise_for_status()
+            store.put(webhook_url, message_id, current)
+            return 'edited'
+        log.info(f'Digest message {message_id} no longer exists, posting a new one.')
+
+    req = post_embeds(embeds, webhook_url, http=http, wait=True)
+    store.put(webhook_url, str(req.json()['id']), current)
+    return 'posted'
+
+def send_embeds(embeds: t.List[dict], webhook_url: str, store: DigestStore = None, http=requests) -> str:
+    '''
+    Publish the embeds as a digest when a store is given, post them otherwise.
+    Returns 'unchanged', 'edited' or 'posted'.
+    '''
+    if store:
+        result = publish_digest(embeds, webhook_url, store, http=http)
+        log.info(f'Digest {result}.')
+        return result
+    post_embeds(embeds, webhook_url, http=http)
+    return 'posted'
+
+def main(gs: Gradescope = None, http=requests, store: DigestStore = None):
+
+    # rate limit, course list TTL and parse processes follow the same env vars as google_task.py
+    gs = gs or Gradescope.from_env()
+
+    # term and course selection happen while scraping the dashboard
+    student_courses: t.Dict[str, Course] = gs.get_courses(course_filter_from_env()).student_courses
+    selected_courses = list(student_courses.values())
+
+    embeds = build_embeds(gs, selected_courses)
+
+    # digest mode: keep one message per webhook up to date instead of reposting
+    if store is None and os.getenv('DIGEST_STATE_FILE'):
+        store = DigestStore(os.getenv('DIGEST_STATE_FILE'))
+    send_embeds(embeds, os.getenv('WEBHOOK_URL'), store, http=http)
+
+if __name__ == '__main__':
+    main()
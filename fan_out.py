@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+import logging
+
+from discord import DigestStore, course_filter_from_env
+from pipeline.factories import make_gradescope, make_task_client, make_pruner, record_cycle_summary
+from pipeline.pipeline import Pipeline
+from pipeline.sinks import Sink, GoogleTasksSink, DiscordSink
+from scheduler.scheduler import PollScheduler
+from task.task import PersistentTaskClient
+from gradescope.metrics import REGISTRY, start_http_server
+from gradescope.tracing import CycleProfiler
+
+load_dotenv()
+
+def make_sinks() -> list:
+    sinks: list[Sink] = []
+    for name in os.getenv('PIPELINE_SINKS', 'google_tasks,discord').split(','):
+        if name == 'google_tasks':
+            sinks.append(GoogleTasksSink(
+                PersistentTaskClient(make_task_client),
+                dry_run=os.getenv('SYNC_DRY_RUN') == '1',
+                pruner=make_pruner()))
+        elif name == 'discord':
+            state_file = os.getenv('DIGEST_STATE_FILE')
+            sinks.append(DiscordSink(
+                os.getenv('WEBHOOK_URL'),
+                store=DigestStore(state_file) if state_file else None))
+        elif name:
+            raise Exception(f'Unknown sink {name}')
+    return sinks
+
+if __name__ == "__main__":
+    # Set up logging
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout), # Log to stdout
+            logging.FileHandler('logs/fan_out.log')
+        ]
+    )
+
+    if (metrics_port := os.getenv('METRICS_PORT')):
+        start_http_server(int(metrics_port))
+
+    gs = make_gradescope()
+    if not gs.logged_in and not gs.login():
+        print('failed to log in Gradescope')
+        sys.exit(1)
+
+    # one run for cron/CI: scrape every selected course, exit non-zero if a sink failed
+    if os.getenv('PIPELINE_ONCE') == '1':
+        pipeline = Pipeline(gs, course_filter_from_env(), make_sinks())
+        results = pipeline.run_once()
+        pipeline.close()
+        sys.exit(1 if any(r.error for r in results) else 0)
+
+    scheduler = PollScheduler(
+        requests_per_hour=int(os.getenv('POLL_REQUESTS_PER_HOUR', 120)))
+    pipeline = Pipeline(gs, course_filter_from_env(), make_sinks(), scheduler=scheduler)
+    profiler = CycleProfiler()
+    while True:
+        started = time.monotonic()
+        before = REGISTRY.snapshot()
+        profiler.run(pipeline.run_once)
+        scheduler.record_cycle(time.monotonic() - started)
+        record_cycle_summary(before, time.monotonic() - started)
+
+        delay = scheduler.seconds_until_next_poll()
+        logging.info(f'Pipeline cycle completed. Next cycle in {delay:.0f} seconds. '
+                     f'Stats: {scheduler.stats.to_dict()}')
+        time.sleep(delay)
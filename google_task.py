@@ -5,96 +5,71 @@ import typing as t
 from dotenv import load_dotenv
 import logging
 
-from collections import defaultdict
-from datetime import timezone, datetime as dt
-
-from task.task import GSTaskClient, GTask
+from task.task import GSTaskClient, PersistentTaskClient
+from task.sync import sync_tasks
+from task.retention import TaskPruner
+from scheduler.scheduler import PollScheduler
 from gradescope.gradescope import Gradescope
-from gradescope.course import Course
-from gradescope.assignment import Assignment, SubmissionStatus as SubStatus
+from gradescope.metrics import REGISTRY, start_http_server
+from gradescope.tracing import CycleProfiler
+from pipeline.factories import make_gradescope, make_task_client, make_pruner, record_cycle_summary
 
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG, 
-    format='%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout), # Log to stdout
-        logging.FileHandler('logs/main.log')
-    ]
-)
-
 logger = logging.getLogger(__name__)
 
-ASSIGNMENT_URL_FMT = 'https://www.gradescope.com/courses/{}/assignments/{}'
-
-def assignment_to_task(assgn: Assignment, course_shortname: str) -> GTask:
-
-    # process & transform time
-    # NOTE: <https://googleapis.github.io/google-api-python-client/docs/dyn/tasks_v1.tasks.html#insert>
-    # > The due date only records date information; the time portion  
-    # > of the timestamp is discarded when setting the due date.
-    due = dt.strptime(assgn.due_time, '%Y-%m-%d %H:%M:%S %z')
-    due = dt(due.year, due.month, due.day, 0, 0, 0, tzinfo=timezone.utc)
-    due = due.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+def main(gs: Gradescope = None, scheduler: PollScheduler = None, pruner: TaskPruner = None,
+         make_client: t.Callable[[], GSTaskClient] = make_task_client):
 
-    return {
-        'title': f'[{course_shortname}] {assgn.name}',
-        'due': due,
-        'status': 'needsAction' if assgn.submission_status == SubStatus.UNSUBMITTED else 'completed',
-        'notes': ASSIGNMENT_URL_FMT.format(assgn.cid, assgn.aid)
-    }
-
-def main():
-
-    gs = Gradescope(
-        username=os.getenv('USERNAME'),
-        password=os.getenv('PASSWORD'))
+    # reusing `gs` across cycles keeps its session and parsed-page cache warm
+    gs = gs or make_gradescope()
     
-    if not gs.login():
+    # a session restored from disk is reused; expired sessions are re-authenticated on demand
+    if not gs.logged_in and not gs.login():
         print('failed to log in Gradescope')
         sys.exit(1)
     
-    # TODO: handle google task api error
-    client = GSTaskClient(
-        client_secret_file=os.getenv('CLIENT_SECRET_FILE'),
-        token_file=os.getenv('TOKEN_FILE'),
-        tasklist_name='gs_deadlines'
-    )
-
-    client.authenticate()       # autheticate
-    client.init_tasklist()      # initiate tasklist, cache existing tasks
+    term, year = os.getenv('COURSES_TERM'), os.getenv('COURSES_YEAR')
+    assert (term is not None) and (year is not None), "Must define term and year in env file"
+
+    sync_tasks(
+        gs,
+        make_client=make_client,
+        term=term,
+        year=year,
+        scheduler=scheduler,
+        dry_run=os.getenv('SYNC_DRY_RUN') == '1',
+        pruner=pruner)
 
-    assignments = []
-    student_courses: t.List[Course] = gs.get_courses().student_courses
-
-    # get Fall 24 courses
-    fa24_courses = list(filter(
-        lambda course: course.term == "Fall" and course.year == "2024",
-            student_courses.values()))
-    
-    for course in fa24_courses:
-        res = gs.get_assignments(course.cid)
-        assignments.extend(res.assignments)
-
-    # only retain undue assignments
-    assignments = list(filter(
-        lambda a: dt.now(timezone.utc) < dt.strptime(a.due_time, '%Y-%m-%d %H:%M:%S %z'), 
-            assignments))
-
-    # convert course + assignment into task out here
-    tasks = defaultdict(GTask)
-    for assignment in assignments:
-        key = assignment.cid + assignment.aid
-        tasks[key] = assignment_to_task(
-            assgn=assignment,
-            course_shortname=student_courses[assignment.cid].shortname)
+if __name__ == "__main__":
+    # Set up logging here, not on import: spawned parse workers re-import this module
+    logging.basicConfig(
+        level=logging.DEBUG, 
+        format='%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout), # Log to stdout
+            logging.FileHandler('logs/main.log')
+        ]
+    )
 
-    client.update_tasks(tasks)
+    if (metrics_port := os.getenv('METRICS_PORT')):
+        start_http_server(int(metrics_port))
 
-if __name__ == "__main__":
+    gs = make_gradescope()
+    profiler = CycleProfiler()
+    pruner = make_pruner()
+    # the tasks client, its connections and credentials outlive the cycles
+    tasks = PersistentTaskClient(make_task_client)
+    scheduler = PollScheduler(
+        requests_per_hour=int(os.getenv('POLL_REQUESTS_PER_HOUR', 120)))
     while True:
-        main()
-        logging.info('Sync completed. Next sync cycle in 10 minutes')
-        time.sleep(600)
\ No newline at end of file
+        started = time.monotonic()
+        before = REGISTRY.snapshot()
+        profiler.run(main, gs, scheduler, pruner, tasks)
+        scheduler.record_cycle(time.monotonic() - started)
+        record_cycle_summary(before, time.monotonic() - started)
+
+        delay = scheduler.seconds_until_next_poll()
+        logging.info(f'Sync completed. Next sync cycle in {delay:.0f} seconds. '
+                     f'Stats: {scheduler.stats.to_dict()}')
+        time.sleep(delay)
\ No newline at end of file
@@ -1,12 +1,63 @@
 import typing as t
 
-from bs4 import BeautifulSoup
 from enum import Enum
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+
+try:
+    from lxml import etree
+except ImportError:     # iter_assignments falls back to parsing whole pages
+    etree = None
 
 try:
    from client import Client
+   from html_parser import ASSIGNMENT_TABLE, ASSIGNMENT_TABLE_ID
+   from tracing import span
 except ModuleNotFoundError:
    from .client import Client
+   from .html_parser import ASSIGNMENT_TABLE, ASSIGNMENT_TABLE_ID
+   from .tracing import span
+
+# Gradescope datetime string should be in this format: YYYY-MM-DD HH:MM:SS z
+GS_DATETIME_FMT = '%Y-%m-%d %H:%M:%S %z'
+
+@lru_cache(maxsize=64)
+def _utc_offset(offset: str) -> timezone:
+    sign = -1 if offset[0] == '-' else 1
+    return timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5])))
+
+@lru_cache(maxsize=8192)
+def parse_datetime(value: str) -> datetime:
+    '''
+    Parse a Gradescope datetime string. Deadlines repeat across courses and
+    cycles, so results are memoized.
+    '''
+    # fast path for "2024-10-01 23:59:00 -0700", strptime for anything else
+    if len(value) == 25 and value[10] == ' ' and value[19] == ' ':
+        try:
+            return datetime(
+                int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                int(value[11:13]), int(value[14:16]), int(value[17:19]),
+                tzinfo=_utc_offset(value[20:]))
+        except ValueError:
+            pass
+    return datetime.strptime(value, GS_DATETIME_FMT)
+
+def _parse_optional(value: t.Optional[str]) -> t.Optional[datetime]:
+    return parse_datetime(value) if value else None
+
+def parse_score(value: t.Optional[str]) -> t.Tuple[t.Optional[float], t.Optional[float]]:
+    '''Points and maximum points of a score like "9.5 / 10.0", (None, None) if unreadable.'''
+    try:
+        points, max_points = value.split('/')
+        return float(points), float(max_points)
+    except (AttributeError, ValueError):
+        return None, None
+
+def _submission_id(href: str) -> t.Optional[str]:
+    # /courses/{cid}/assignments/{aid}/submissions/{sid}
+    parts = href.split('/')
+    return parts[6] if len(parts) > 6 and parts[5] == 'submissions' else None
 
 class SubmissionStatus(Enum):
     UNSUBMITTED = 0
@@ -14,15 +65,35 @@ class SubmissionStatus(Enum):
     GRADED = 2
 
 class Assignment:
+    __slots__ = ('aid', 'cid', 'name', 'submission_status',
+                 'released_time', 'due_time', 'late_due_time',
+                 'released_at', 'due_at', 'late_due_at',
+                 'submission_id', 'score', 'points', 'max_points')
 
-    def __init__(self, aid, cid, name, submission_status, released_time, due_time, late_due_time) -> None:
+    def __init__(self, aid, cid, name, submission_status, released_time, due_time, late_due_time,
+                 submission_id=None, score=None) -> None:
         self.aid = aid
         self.cid = cid
         self.name = name
         self.submission_status = submission_status
+        # raw Gradescope strings
         self.released_time = released_time
         self.due_time = due_time
         self.late_due_time = late_due_time
+        # parsed once at scrape time, None when absent
+        self.released_at = _parse_optional(released_time)
+        self.due_at = _parse_optional(due_time)
+        self.late_due_at = _parse_optional(late_due_time)
+        # set once submitted / graded
+        self.submission_id = submission_id
+        self.score = score      # raw score text, e.g. "9.5 / 10.0"
+        self.points, self.max_points = parse_score(score) if score else (None, None)
+
+    def __reduce__(self):
+        # pickled as the raw fields, e.g. between parse processes; the datetimes are parsed again
+        return (Assignment, (self.aid, self.cid, self.name, self.submission_status,
+                             self.released_time, self.due_time, self.late_due_time,
+                             self.submission_id, self.score))
     
     def __repr__(self) -> str:
         return f'<Assignment id={self.aid}>'
@@ -30,16 +101,107 @@ class Assignment:
 class GetAssignmentsResult:
     def __init__(self,
                  course_id: str = None,
-                 assignments: t.List[Assignment] = []) -> None:
+                 assignments: t.List[Assignment] = [],
+                 error: Exception = None) -> None:
         self.course_id = course_id
         self.assignments = assignments
+        self.error = error  # set when the course could not be scraped
 
 class AssignmentClient(Client):
+    PAGE = 'assignments'
+    STREAM_CHUNK_SIZE = 16 * 1024
 
     def get_assignments(self, course_id):
-        assignment_resp = self._request('GET', '/courses/' + course_id)
-        parsed_assignment_resp = BeautifulSoup(assignment_resp.text, 'html.parser')
+        if self.parse_pool:
+            parse = lambda resp: self.parse_pool.parse_assignments(course_id, resp.content, resp.encoding)
+        else:
+            parse = lambda resp: self._parse_assignments(course_id, resp.text)
+        return self._get_parsed('/courses/' + course_id, parse)
+
+    def iter_assignments(self, course_id) -> t.Iterator[Assignment]:
+        '''
+        Yield the assignments of a course as their rows arrive. The page is
+        read in chunks through lxml's incremental parser and rows are dropped
+        once converted, so memory stays bounded by a chunk and a row. Streamed
+        pages bypass the response cache; without lxml the page is parsed whole.
+        '''
+        if etree is None:
+            yield from self.get_assignments(course_id).assignments
+            return
+
+        with self._request('GET', '/courses/' + course_id, stream=True) as response:
+            parser = etree.HTMLPullParser(events=('start', 'end'), encoding=response.encoding or 'utf-8')
+            in_table = in_body = False
+
+            for chunk in response.iter_content(self.STREAM_CHUNK_SIZE):
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if elem.tag == 'table' and elem.get('id') == ASSIGNMENT_TABLE_ID:
+                        in_table = event == 'start'
+                    elif in_table and elem.tag == 'tbody':
+                        in_body = event == 'start'
+                    elif in_body and event == 'end' and elem.tag == 'tr' and elem.get('role') == 'row':
+                        yield self._row_to_assignment(course_id, elem)
+                        # free the converted rows
+                        elem.clear(keep_tail=True)
+                        while elem.getprevious() is not None:
+                            del elem.getparent()[0]
+            parser.close()
+
+    def _row_to_assignment(self, course_id, assignment_row) -> Assignment:
+        '''`_extract_assignments` for a single row parsed by lxml.'''
+        row_items = [c for c in assignment_row if isinstance(c.tag, str)]
+
+        name = ''.join(row_items[0].itertext())
+        aid = None
+        submission_status = None
+        released_time = None
+        due_time = None
+        late_due_time = None
+        submission_id = None
+        score = None
+
+        if (a := row_items[0].find('.//a')) is not None:
+            aid = a.get('href').split('/')[4]
+            submission_id = _submission_id(a.get('href'))
+        elif (b := row_items[0].find('.//button')) is not None:
+            aid = b.get('data-assignment-id')
+
+        for c in row_items[1]:
+            if isinstance(c.tag, str) and (cls := (c.get('class') or '').split()):
+                if cls[0] == 'submissionStatus--score':
+                    submission_status = SubmissionStatus.GRADED
+                    score = ''.join(c.itertext()).strip()
+                elif cls[0] == 'submissionStatus--text':
+                    text = ''.join(c.itertext())
+                    if text == 'Submitted':
+                        submission_status = SubmissionStatus.SUBMITTED
+                    elif text == 'No Submission':
+                        submission_status = SubmissionStatus.UNSUBMITTED
+        if not submission_status:
+            raise Exception('Unknown submission status')
+
+        # some datetime data exists
+        for div in row_items[2].iter('div'):
+            if 'progressBar--caption' in (div.get('class') or '').split():
+                times = list(div.iter('time'))
+                assert len(times) >= 2
+                released_time = times[0].get('datetime')
+                due_time = times[1].get('datetime')
+                if len(times) == 3:
+                    late_due_time = times[2].get('datetime')
+                break
+
+        return Assignment(aid, course_id, name, submission_status,
+                          released_time, due_time, late_due_time, submission_id, score)
+
+    def _parse_assignments(self, course_id, html) -> GetAssignmentsResult:
+        with span('parse.soup', page=self.PAGE, course_id=course_id):
+            parsed_assignment_resp = self.parser.parse(html, parse_only=ASSIGNMENT_TABLE)
+        with span('parse.extract', page=self.PAGE, course_id=course_id):
+            return self._extract_assignments(course_id, parsed_assignment_resp)
 
+    def _extract_assignments(self, course_id, parsed_assignment_resp) -> GetAssignmentsResult:
         assignment_table = parsed_assignment_resp.find('table', attrs={'id': 'assignments-student-table'})
         assignment_rows = assignment_table.find('tbody')
 
@@ -53,9 +215,12 @@ class AssignmentClient(Client):
             released_time = None
             due_time = None
             late_due_time = None
+            submission_id = None
+            score = None
 
             if (a := row_items[0].find('a')):
                 aid = a.get('href').split('/')[4]
+                submission_id = _submission_id(a.get('href'))
             elif (b := row_items[0].find('button')):
                 aid = b.get('data-assignment-id')
 
@@ -63,6 +228,7 @@ class AssignmentClient(Client):
                 if cls := c.get('class'):
                     if cls[0] == 'submissionStatus--score':
                         submission_status = SubmissionStatus.GRADED
+                        score = c.text.strip()
                     elif cls[0] == 'submissionStatus--text':
                         if c.text == 'Submitted':
                             submission_status = SubmissionStatus.SUBMITTED
@@ -82,7 +248,7 @@ class AssignmentClient(Client):
             
             assignments.append(
                 Assignment(aid, course_id, name, submission_status,
-                    released_time, due_time, late_due_time))
+                    released_time, due_time, late_due_time, submission_id, score))
         
         return GetAssignmentsResult(
             course_id=course_id,
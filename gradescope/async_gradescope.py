@@ -0,0 +1,263 @@
+import time
+import asyncio
+import typing as t
+import logging as log
+import functools
+import httpx
+
+try:
+   from client import Client, ResponseCache, FETCH_SECONDS
+   from rate_limit import RateLimiter, RetryPolicy
+   from course import CourseClient, CourseFilter, CourseCatalog, GetCoursesResult
+   from assignment import AssignmentClient, GetAssignmentsResult
+   from session_store import SessionStore
+   from html_parser import ParserBackend
+   from tracing import span
+   from gradescope import ConnState, Gradescope, parse_auth_token, make_login_data, CALL_SECONDS
+except ModuleNotFoundError:
+   from .client import Client, ResponseCache, FETCH_SECONDS
+   from .rate_limit import RateLimiter, RetryPolicy
+   from .course import CourseClient, CourseFilter, CourseCatalog, GetCoursesResult
+   from .assignment import AssignmentClient, GetAssignmentsResult
+   from .session_store import SessionStore
+   from .html_parser import ParserBackend
+   from .tracing import span
+   from .gradescope import ConnState, Gradescope, parse_auth_token, make_login_data, CALL_SECONDS
+
+def _ensure_login(func):
+    """
+    Decorator to ensure valid credentials before awaiting the methods.
+    """
+    @functools.wraps(func)
+    async def login_wrapper(self, *args, **kwargs):
+        if self.state != ConnState.LOGGED_IN:
+            if not await self.login():
+                raise Exception('Invalid Gradescope credentials')
+        return await func(self, *args, **kwargs)
+
+    return login_wrapper
+
+class AsyncClient(Client):
+    '''
+    Client whose requests go through an `httpx.AsyncClient`. Parsing and the
+    response cache are shared with the blocking clients.
+    '''
+
+    def __init__(self, session: httpx.AsyncClient = None,
+                 reauth: t.Callable[[float], t.Awaitable[bool]] = None,
+                 cache: ResponseCache = None,
+                 parser: ParserBackend = None,
+                 rate_limiter: RateLimiter = None,
+                 retry: RetryPolicy = None):
+        # timeouts are configured on the httpx client
+        super().__init__(session, reauth=reauth, cache=cache, parser=parser,
+                         rate_limiter=rate_limiter, retry=retry, timeout=None)
+
+    async def _request(self, method, endpoint, **kwargs) -> httpx.Response:
+
+        with span('gradescope.request', method=method, endpoint=endpoint):
+            url = f'{self.BASE_URL}{endpoint}'
+            sent_at = time.monotonic()
+            response = await self._send(method, url, **kwargs)
+
+            # an expired session is redirected to the login page; log in again once and retry
+            if self._is_login_redirect(response):
+                if self.reauth is None or not await self.reauth(sent_at):
+                    raise Exception('Gradescope session expired')
+                response = await self._send(method, url, **kwargs)
+                if self._is_login_redirect(response):
+                    raise Exception('Gradescope session expired')
+
+            if response.status_code in (200, 201, 304):
+                return response
+            else:
+                response.raise_for_status()
+
+    async def _send(self, method, url, **kwargs) -> httpx.Response:
+        bucket = self.rate_limiter.bucket(url) if self.rate_limiter else None
+
+        attempt = 0
+        while True:
+            if bucket and (wait := bucket.reserve()) > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt >= self.retry.max_retries:
+                    raise
+                delay = self.retry.delay(attempt)
+                log.warning(f'Request failed: url={url} error={e!r} retry_in={delay:.1f}s')
+            else:
+                if not self.retry.should_retry(response.status_code, attempt):
+                    return response
+                delay = self.retry.delay(attempt, response.headers)
+                log.warning(f'Request throttled: url={url} status={response.status_code} retry_in={delay:.1f}s')
+                if bucket and response.status_code == 429:
+                    bucket.pause(delay)     # slow down every request to this host
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _get_parsed(self, endpoint, parse: t.Callable[[httpx.Response], t.Any], cache_key: str = None):
+        if self.cache is None:
+            with FETCH_SECONDS.time(page=self.PAGE, phase='http'):
+                response = await self._request('GET', endpoint)
+            with FETCH_SECONDS.time(page=self.PAGE, phase='parse'):
+                return parse(response)
+
+        cache_key = cache_key or endpoint
+        entry = self.cache.get(cache_key)
+        headers = entry.conditional_headers() if entry else {}
+        with FETCH_SECONDS.time(page=self.PAGE, phase='http'):
+            response = await self._request('GET', endpoint, headers=headers)
+        with FETCH_SECONDS.time(page=self.PAGE, phase='parse'):
+            return self._parse_cached(cache_key, entry, response, parse)
+
+class AsyncCourseClient(AsyncClient, CourseClient):
+
+    async def get_courses(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        cache_key = f'/account#{course_filter.key}' if course_filter else '/account'
+        return await self._get_parsed('/account', lambda res: self._parse_courses(res.text, course_filter),
+                                      cache_key=cache_key)
+
+class AsyncAssignmentClient(AsyncClient, AssignmentClient):
+
+    async def get_assignments(self, course_id) -> GetAssignmentsResult:
+        return await self._get_parsed(
+            '/courses/' + course_id,
+            lambda resp: self._parse_assignments(course_id, resp.text))
+
+class AsyncGradescope():
+    '''
+    asyncio counterpart of `Gradescope`, built on one `httpx.AsyncClient`
+    whose connection pool is shared by all requests. Use as an async context
+    manager or call `aclose()` when done.
+    '''
+    BASE_URL = Gradescope.BASE_URL
+    DEFAULT_MAX_CONCURRENCY = 16
+
+    def __init__(self, username, password, session_file: str = None,
+                 parser: ParserBackend = None,
+                 max_connections: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout: float = 30.0,
+                 connect_timeout: float = 5.0,
+                 rate_limiter: RateLimiter = None,
+                 retry: RetryPolicy = None,
+                 course_ttl: float = CourseCatalog.DEFAULT_TTL) -> None:
+
+        self.username = username
+        self.password = password
+
+        self.session = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections))
+        self.state = ConnState.INIT
+        self.account = None
+
+        self.response_cache = ResponseCache()
+        self.parser = parser or ParserBackend()
+
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retry = retry or RetryPolicy()
+        self._http = AsyncClient(self.session, rate_limiter=self.rate_limiter, retry=self.retry)
+
+        # the course list is scraped again only after `course_ttl` seconds or invalidation
+        self.course_catalog = CourseCatalog(self._fetch_courses, ttl=course_ttl)
+
+        self._login_lock = asyncio.Lock()
+        self._last_login = float('-inf')
+
+        self.session_store = SessionStore(session_file) if session_file else None
+        if self.session_store and self.session_store.load(self.session.cookies.jar):
+            log.info('Restored Gradescope session from disk.')
+            self.state = ConnState.LOGGED_IN
+
+    @property
+    def logged_in(self) -> bool:
+        return self.state == ConnState.LOGGED_IN
+
+    async def login(self) -> bool:
+        '''
+        Login to gradescope using email and password.
+        '''
+        with CALL_SECONDS.time(call='login'), span('gradescope.login'):
+            init_resp = await self._http._send('GET', self.BASE_URL)
+            login_data = make_login_data(
+                self.username, self.password,
+                auth_token=parse_auth_token(self.parser, init_resp.text),
+                remember_me=self.session_store is not None)
+            login_resp = await self._http._send('POST', f'{self.BASE_URL}/login', params=login_data)
+        if len(login_resp.history) != 0 and login_resp.history[0].status_code == httpx.codes.FOUND:
+            self.state = ConnState.LOGGED_IN
+            self._last_login = time.monotonic()
+            if self.session_store:
+                self.session_store.save(self.session.cookies.jar)
+            return True
+
+        self.state = ConnState.INIT
+        return False
+
+    async def _reauth(self, sent_at: float) -> bool:
+        async with self._login_lock:
+            if self._last_login > sent_at:
+                return True     # another request already logged in again
+            log.info('Gradescope session expired, logging in again.')
+            self.state = ConnState.INIT
+            return await self.login()
+
+    def _client(self, client_cls):
+        return client_cls(self.session, reauth=self._reauth, cache=self.response_cache,
+                          parser=self.parser, rate_limiter=self.rate_limiter, retry=self.retry)
+
+    @_ensure_login
+    async def get_courses(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        '''
+        Courses matching `course_filter` (all courses by default), served from
+        the course catalog while it is fresh.
+        '''
+        return await self.course_catalog.aget(course_filter)
+
+    def invalidate_courses(self) -> None:
+        self.course_catalog.invalidate()
+
+    async def _fetch_courses(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        with CALL_SECONDS.time(call='get_courses'), span('gradescope.get_courses'):
+            return await self._client(AsyncCourseClient).get_courses(course_filter)
+
+    @_ensure_login
+    async def get_assignments(self, course_id: str) -> GetAssignmentsResult:
+        with CALL_SECONDS.time(call='get_assignments'), span('gradescope.get_assignments', course_id=course_id):
+            return await self._client(AsyncAssignmentClient).get_assignments(course_id)
+
+    @_ensure_login
+    async def get_assignments_many(self, course_ids: t.Iterable[str],
+                                   max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> t.List[GetAssignmentsResult]:
+        '''
+        Fetch assignments of several courses concurrently on the event loop.
+        Results follow the order of `course_ids`; a failed course yields a
+        result with `error` set.
+        '''
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(course_id):
+            async with semaphore:
+                try:
+                    with CALL_SECONDS.time(call='get_assignments'), span('gradescope.get_assignments', course_id=course_id):
+                        return await self._client(AsyncAssignmentClient).get_assignments(course_id)
+                except Exception as e:
+                    log.warning(f'Failed to get assignments: course_id={course_id} error={e!r}')
+                    return GetAssignmentsResult(course_id=course_id, assignments=[], error=e)
+
+        return list(await asyncio.gather(*(fetch(course_id) for course_id in course_ids)))
+
+    to_datetime_object = staticmethod(Gradescope.to_datetime_object)
+
+    async def aclose(self) -> None:
+        await self.session.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
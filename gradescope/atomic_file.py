@@ -0,0 +1,31 @@
+import os
+import typing as t
+import tempfile
+
+
+def atomic_write(path: str, data: t.Union[str, bytes]) -> None:
+    '''
+    Replace the file at `path` with `data` in one step, so a crash never
+    leaves it truncated. The data goes to a uniquely named temp file in the
+    same directory first, which keeps concurrent writers from clobbering each
+    other's temp file and is removed if the write fails. The file is readable
+    by its owner only.
+    '''
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    with tempfile.NamedTemporaryFile(mode, dir=os.path.dirname(path) or '.',
+                                     prefix=f'.{os.path.basename(path)}.', suffix='.tmp',
+                                     delete=False) as f:
+        tmp_path = f.name
+        try:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -1,21 +1,182 @@
+import re
+import time
+import hashlib
+import threading
+import typing as t
+import logging as log
 import requests
+from urllib.parse import urlparse
+
+try:
+   from html_parser import ParserBackend, default_backend
+   from rate_limit import RateLimiter, RetryPolicy
+   from metrics import REGISTRY
+   from tracing import span
+except ModuleNotFoundError:
+   from .html_parser import ParserBackend, default_backend
+   from .rate_limit import RateLimiter, RetryPolicy
+   from .metrics import REGISTRY
+   from .tracing import span
+
+FETCH_SECONDS = REGISTRY.histogram(
+    'gradescope_fetch_seconds', 'Time spent fetching (http) and parsing (parse) Gradescope pages.',
+    ('page', 'phase'))
+
+class CacheEntry:
+    def __init__(self, etag=None, last_modified=None, digest=None, parsed=None) -> None:
+        self.etag = etag                    # ETag validator sent back by the server, if any
+        self.last_modified = last_modified  # Last-Modified validator sent back by the server, if any
+        self.digest = digest                # hash of the response body the result was parsed from
+        self.parsed = parsed                # parsed result, e.g. GetAssignmentsResult
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    '''
+    Parsed results of GET endpoints, keyed by endpoint. Shared by all clients
+    of a Gradescope session so unchanged pages are not parsed again.
+    '''
+
+    def __init__(self) -> None:
+        self._entries: t.Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> t.Optional[CacheEntry]:
+        with self._lock:
+            return self._entries.get(endpoint)
+
+    def put(self, endpoint: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[endpoint] = entry
+
+    def invalidate(self, endpoint: str = None) -> None:
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(endpoint, None)
 
 class Client:
     BASE_URL = 'https://www.gradescope.com'
+    LOGIN_PATH = '/login'
+    PAGE = 'other'      # page label of the fetch metrics
+    # per-request CSRF tokens change on every page load and are ignored when hashing bodies
+    VOLATILE_PATTERN = re.compile(rb'<meta name="csrf-token" content="[^"]*"|name="authenticity_token" value="[^"]*"')
+    DEFAULT_TIMEOUT = (5, 30)   # connect, read timeouts in seconds
 
-    def __init__(self, session: requests.Session = None):
+    def __init__(self, session: requests.Session = None,
+                 reauth: t.Callable[[float], bool] = None,
+                 cache: ResponseCache = None,
+                 parser: ParserBackend = None,
+                 rate_limiter: RateLimiter = None,
+                 retry: RetryPolicy = None,
+                 timeout = DEFAULT_TIMEOUT,
+                 parse_pool = None):
         self.session = session
+        # called with the time the request was sent when the session turns out to be expired
+        self.reauth = reauth
+        self.cache = cache
+        self.parser = parser or default_backend
+        self.rate_limiter = rate_limiter
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        # optional `ParsePool`, pages are parsed in its worker processes instead of this thread
+        self.parse_pool = parse_pool
 
     def _request(self, method, endpoint, **kwargs) -> requests.Response:
 
-        url = f'{self.BASE_URL}{endpoint}'
-        response = self.session.request(method, url, **kwargs)
-        
-        if response.status_code in (200, 201):
-            return response
+        with span('gradescope.request', method=method, endpoint=endpoint):
+            url = f'{self.BASE_URL}{endpoint}'
+            sent_at = time.monotonic()
+            response = self._send(method, url, **kwargs)
+
+            # an expired session is redirected to the login page; log in again once and retry
+            if self._is_login_redirect(response):
+                if self.reauth is None or not self.reauth(sent_at):
+                    raise Exception('Gradescope session expired')
+                response = self._send(method, url, **kwargs)
+                if self._is_login_redirect(response):
+                    raise Exception('Gradescope session expired')
+
+            if response.status_code in (200, 201, 304):
+                return response
+            else:
+                response.raise_for_status()
+
+    def _send(self, method, url, **kwargs) -> requests.Response:
+        '''
+        Send a request within the rate limit, retrying throttled, failed and
+        timed out requests with backoff.
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        bucket = self.rate_limiter.bucket(url) if self.rate_limiter else None
+
+        attempt = 0
+        while True:
+            if bucket:
+                bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retry.max_retries:
+                    raise
+                delay = self.retry.delay(attempt)
+                log.warning(f'Request failed: url={url} error={e!r} retry_in={delay:.1f}s')
+            else:
+                if not self.retry.should_retry(response.status_code, attempt):
+                    return response
+                delay = self.retry.delay(attempt, response.headers)
+                log.warning(f'Request throttled: url={url} status={response.status_code} retry_in={delay:.1f}s')
+                if bucket and response.status_code == 429:
+                    bucket.pause(delay)     # slow down every request to this host
+            time.sleep(delay)
+            attempt += 1
+
+    def _get_parsed(self, endpoint, parse: t.Callable[[requests.Response], t.Any], cache_key: str = None):
+        '''
+        GET `endpoint` and return `parse(response)`, reusing the cached result when
+        the server answers 304 or the body hashes the same as last time. Results are
+        cached under `cache_key` (the endpoint by default).
+        '''
+        if self.cache is None:
+            with FETCH_SECONDS.time(page=self.PAGE, phase='http'):
+                response = self._request('GET', endpoint)
+            with FETCH_SECONDS.time(page=self.PAGE, phase='parse'):
+                return parse(response)
+
+        cache_key = cache_key or endpoint
+        entry = self.cache.get(cache_key)
+        headers = entry.conditional_headers() if entry else {}
+        with FETCH_SECONDS.time(page=self.PAGE, phase='http'):
+            response = self._request('GET', endpoint, headers=headers)
+        with FETCH_SECONDS.time(page=self.PAGE, phase='parse'):
+            return self._parse_cached(cache_key, entry, response, parse)
+
+    def _parse_cached(self, cache_key, entry: t.Optional[CacheEntry], response, parse):
+        if entry and response.status_code == 304:
+            return entry.parsed
+
+        digest = hashlib.sha256(self.VOLATILE_PATTERN.sub(b'', response.content)).digest()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        if entry and entry.digest == digest:
+            parsed = entry.parsed
         else:
-            response.raise_for_status()
-    
+            parsed = parse(response)
+        self.cache.put(cache_key, CacheEntry(etag, last_modified, digest, parsed))
+        return parsed
+
+    def _is_login_redirect(self, response: requests.Response) -> bool:
+        return (len(response.history) != 0
+                and urlparse(str(response.url)).path == self.LOGIN_PATH)
+
     def __enter__(self):
         return self
 
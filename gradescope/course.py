@@ -1,13 +1,19 @@
+import time
+import threading
 import typing as t
 from collections import defaultdict
-from bs4 import BeautifulSoup
 
 try:
    from client import Client
+   from html_parser import COURSE_LISTS
+   from tracing import span
 except ModuleNotFoundError:
    from .client import Client
+   from .html_parser import COURSE_LISTS
+   from .tracing import span
 
 class Course:
+    __slots__ = ('cid', 'name', 'shortname', 'term', 'year')
     
     def __init__(self, cid, name, shortname, term, year):
         self.cid = cid
@@ -32,11 +38,53 @@ class GetCoursesResult:
             f"instructor={len(self.instructor_courses)}>"
         )
     
+class CourseFilter:
+    '''
+    Which courses to scrape: a term and year, narrowed by included/excluded
+    course IDs. Unset fields match everything.
+    '''
+    __slots__ = ('term', 'year', 'include', 'exclude')
+
+    def __init__(self, term: str = None, year: str = None,
+                 include: t.Iterable[str] = None, exclude: t.Iterable[str] = None) -> None:
+        self.term = term
+        self.year = year
+        self.include = frozenset(include or ())
+        self.exclude = frozenset(exclude or ())
+
+    def matches_term(self, term, year) -> bool:
+        return (self.term is None or term == self.term) and (self.year is None or year == self.year)
+
+    def matches_course(self, cid) -> bool:
+        return (not self.include or cid in self.include) and cid not in self.exclude
+
+    @property
+    def key(self) -> tuple:
+        return (self.term, self.year, tuple(sorted(self.include)), tuple(sorted(self.exclude)))
+
+    def __repr__(self) -> str:
+        return (f'<CourseFilter term={self.term} {self.year} '
+                f'include={sorted(self.include)} exclude={sorted(self.exclude)}>')
+
 class CourseClient(Client):
+    PAGE = 'courses'
+
+    def get_courses(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        # results differ per filter, so each filter gets its own cache entry
+        cache_key = f'/account#{course_filter.key}' if course_filter else '/account'
+        if self.parse_pool:
+            parse = lambda res: self.parse_pool.parse_courses(res.content, res.encoding, course_filter)
+        else:
+            parse = lambda res: self._parse_courses(res.text, course_filter)
+        return self._get_parsed('/account', parse, cache_key=cache_key)
+
+    def _parse_courses(self, html, course_filter: CourseFilter = None) -> GetCoursesResult:
+        with span('parse.soup', page=self.PAGE):
+            parsed_account_resp = self.parser.parse(html, parse_only=COURSE_LISTS)
+        with span('parse.extract', page=self.PAGE):
+            return self._extract_courses(parsed_account_resp, course_filter)
 
-    def get_courses(self) -> GetCoursesResult:
-        res = self._request('GET', '/account')
-        parsed_account_resp = BeautifulSoup(res.text, 'html.parser')
+    def _extract_courses(self, parsed_account_resp, course_filter: CourseFilter = None) -> GetCoursesResult:
 
         # Get instructor course data
         '''
@@ -59,19 +107,67 @@ class CourseClient(Client):
 
         student_courses = defaultdict(Course)
         student_courses_html = parsed_account_resp.find('h1', class_ ='pageHeading', string = "Course Dashboard").next_sibling
-        for course_html in student_courses_html.find_all('a', class_ = 'courseBox'):
-            shortname = course_html.find('h3', class_ = 'courseBox--shortname').text
-            name = course_html.find('div', class_ = 'courseBox--name').text
-            cid = course_html.get("href").split("/")[-1]
-            term, year = None, None
-            
-            for tag in course_html.parent.previous_siblings:
-                cls = tag.get("class")
-                if len(cls) and cls[0] == "courseList--term":
-                    term, year = tag.text.split()
-                    break
-            student_courses[cid] = Course(cid, name, shortname, term, year)
+
+        # the list alternates term headings and the courses of that term; terms
+        # that don't match the filter are skipped without walking their courses
+        term, year = None, None
+        for section in student_courses_html.find_all(recursive=False):
+            cls = section.get("class") or []
+            if len(cls) and cls[0] == "courseList--term":
+                term, year = section.text.split()
+                continue
+            if course_filter and not course_filter.matches_term(term, year):
+                continue
+
+            for course_html in section.find_all('a', class_ = 'courseBox'):
+                cid = course_html.get("href").split("/")[-1]
+                if course_filter and not course_filter.matches_course(cid):
+                    continue
+                shortname = course_html.find('h3', class_ = 'courseBox--shortname').text
+                name = course_html.find('div', class_ = 'courseBox--name').text
+                student_courses[cid] = Course(cid, name, shortname, term, year)
         
         return GetCoursesResult(
             student_courses=student_courses
         )
+
+class CourseCatalog:
+    '''
+    Course lists kept for `ttl` seconds per filter, since enrollment rarely
+    changes. `invalidate()` forces the next lookup to scrape again. `fetch`
+    is a coroutine function for catalogs read with `aget()`.
+    '''
+    DEFAULT_TTL = 6 * 60 * 60
+
+    def __init__(self, fetch: t.Callable[[t.Optional[CourseFilter]], GetCoursesResult],
+                 ttl: float = DEFAULT_TTL) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self._entries: t.Dict[tuple, t.Tuple[float, GetCoursesResult]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        if (result := self._lookup(course_filter)) is None:
+            result = self._store(course_filter, self.fetch(course_filter))
+        return result
+
+    async def aget(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        if (result := self._lookup(course_filter)) is None:
+            result = self._store(course_filter, await self.fetch(course_filter))
+        return result
+
+    def _lookup(self, course_filter: t.Optional[CourseFilter]) -> t.Optional[GetCoursesResult]:
+        with self._lock:
+            entry = self._entries.get(course_filter.key if course_filter else None)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        return None
+
+    def _store(self, course_filter: t.Optional[CourseFilter], result: GetCoursesResult) -> GetCoursesResult:
+        with self._lock:
+            self._entries[course_filter.key if course_filter else None] = (time.monotonic(), result)
+        return result
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
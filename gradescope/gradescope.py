@@ -1,14 +1,41 @@
+import os
+import time
+import typing as t
+import logging as log
+import threading
+import contextvars
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from enum import Enum
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 try:
-   from course import Course, CourseClient
-   from assignment import Assignment, AssignmentClient
+   from course import CourseClient, CourseFilter, CourseCatalog, GetCoursesResult
+   from assignment import Assignment, AssignmentClient, GetAssignmentsResult, SubmissionStatus, parse_datetime
+   from submission import SubmissionCache, SubmissionClient, SubmissionResult, needs_fetch
+   from session_store import SessionStore
+   from client import Client, ResponseCache
+   from html_parser import ParserBackend, LOGIN_FORM
+   from rate_limit import RateLimiter, RetryPolicy
+   from metrics import REGISTRY
+   from tracing import span
 except ModuleNotFoundError:
-   from .course import Course, CourseClient
-   from .assignment import Assignment, AssignmentClient
+   from .course import CourseClient, CourseFilter, CourseCatalog, GetCoursesResult
+   from .assignment import Assignment, AssignmentClient, GetAssignmentsResult, SubmissionStatus, parse_datetime
+   from .submission import SubmissionCache, SubmissionClient, SubmissionResult, needs_fetch
+   from .session_store import SessionStore
+   from .client import Client, ResponseCache
+   from .html_parser import ParserBackend, LOGIN_FORM
+   from .rate_limit import RateLimiter, RetryPolicy
+   from .metrics import REGISTRY
+   from .tracing import span
+
+if t.TYPE_CHECKING:     # the process pool machinery is only imported by callers that use it
+   from .parse_pool import ParsePool
+
+CALL_SECONDS = REGISTRY.histogram(
+    'gradescope_call_seconds', 'Duration of Gradescope logins and page fetches.', ('call',))
 
 class ConnState(Enum):
     INIT = 0
@@ -26,59 +53,249 @@ def _ensure_login(func):
 
     return login_wrapper
 
+def parse_auth_token(parser: ParserBackend, html) -> t.Optional[str]:
+    '''
+    Scrape the authenticity token of the login form from the homepage.
+    '''
+    auth_token = None
+    parsed_init_resp = parser.parse(html, parse_only=LOGIN_FORM)
+    for form in parsed_init_resp.find_all('form'):
+        if form.get("action") == "/login":
+            for inp in form.find_all('input'):
+                if inp.get('name') == "authenticity_token":
+                    auth_token = inp.get('value')
+    return auth_token
+
+def make_login_data(username, password, auth_token, remember_me: bool = False) -> dict:
+    return {
+        "utf8": "✓",
+        "session[email]": username,
+        "session[password]": password,
+        "session[remember_me]": 1 if remember_me else 0,
+        "commit": "Log In",
+        "session[remember_me_sso]": 0,
+        "authenticity_token": auth_token,
+    }
+
 class Gradescope():
     BASE_URL = 'https://www.gradescope.com'
+    DEFAULT_MAX_WORKERS = 8
+    POOL_MAXSIZE = 16
     
-    def __init__(self, username, password) -> None:
+    def __init__(self, username, password, session_file: str = None,
+                 parser: ParserBackend = None,
+                 rate_limiter: RateLimiter = None,
+                 retry: RetryPolicy = None,
+                 timeout = Client.DEFAULT_TIMEOUT,
+                 course_ttl: float = CourseCatalog.DEFAULT_TTL,
+                 parse_pool: 'ParsePool' = None,
+                 submission_cache_file: str = None) -> None:
 
         self.username = username
         self.password = password
 
         self.session = requests.Session()
+        # size the connection pool so concurrent course fetches reuse connections
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=self.POOL_MAXSIZE))
         self.state = ConnState.INIT
         self.account = None
 
+        # parsed pages are reused while their content stays the same
+        self.response_cache = ResponseCache()
+        self.parser = parser or ParserBackend()
+        # parse in worker processes when given; share one pool between instances
+        self.parse_pool = parse_pool
+
+        # every request, logins included, is throttled per host and retried with backoff;
+        # pass the same limiter to several instances to share one budget
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        self._http = Client(self.session, rate_limiter=self.rate_limiter,
+                            retry=self.retry, timeout=self.timeout)
+
+        # fetched submission results, only new and regraded submissions are fetched again
+        self.submission_cache = SubmissionCache(submission_cache_file)
+
+        # the course list is scraped again only after `course_ttl` seconds or invalidation
+        self.course_catalog = CourseCatalog(self._fetch_courses, ttl=course_ttl)
+
+        self._login_lock = threading.Lock()
+        self._last_login = float('-inf')
+
+        # reuse a previously stored session; expiry is detected by the clients on first use
+        self.session_store = SessionStore(session_file) if session_file else None
+        if self.session_store and self.session_store.load(self.session.cookies):
+            log.info('Restored Gradescope session from disk.')
+            self.state = ConnState.LOGGED_IN
+
+    @classmethod
+    def from_env(cls) -> 'Gradescope':
+        '''
+        A client configured by the environment: credentials, session file,
+        course list TTL, rate limit and parse processes.
+        '''
+        parse_pool = None
+        if os.getenv('GS_PARSE_PROCESSES'):
+            # the process pool machinery is only imported when it is used
+            try:
+               from parse_pool import ParsePool
+            except ModuleNotFoundError:
+               from .parse_pool import ParsePool
+            parse_pool = ParsePool.from_env()
+
+        return cls(
+            username=os.getenv('USERNAME'),
+            password=os.getenv('PASSWORD'),
+            session_file=os.getenv('GS_SESSION_FILE'),
+            course_ttl=float(os.getenv('COURSES_TTL_SECONDS', CourseCatalog.DEFAULT_TTL)),
+            parse_pool=parse_pool,
+            rate_limiter=RateLimiter(
+                rate=float(os.getenv('GS_RATE_LIMIT', 2.0)),
+                burst=int(os.getenv('GS_RATE_BURST', 5))))
+
+    @property
+    def logged_in(self) -> bool:
+        return self.state == ConnState.LOGGED_IN
+
     def login(self) -> bool:
         '''
         Login to gradescope using email and password.
         Note that the future commands depend on account privilages.
         '''
-        init_resp = self.session.get(self.BASE_URL)
-        parsed_init_resp = BeautifulSoup(init_resp.text, 'html.parser')
-        for form in parsed_init_resp.find_all('form'):
-            if form.get("action") == "/login":
-                for inp in form.find_all('input'):
-                    if inp.get('name') == "authenticity_token":
-                        auth_token = inp.get('value')
-
-        login_data = {
-            "utf8": "✓",
-            "session[email]": self.username,
-            "session[password]": self.password,
-            "session[remember_me]": 0,
-            "commit": "Log In",
-            "session[remember_me_sso]": 0,
-            "authenticity_token": auth_token,
-        }
-        login_resp = self.session.post("https://www.gradescope.com/login", params=login_data)
+        with CALL_SECONDS.time(call='login'), span('gradescope.login'):
+            init_resp = self._http._send('GET', self.BASE_URL)
+            login_data = make_login_data(
+                self.username, self.password,
+                auth_token=parse_auth_token(self.parser, init_resp.text),
+                remember_me=self.session_store is not None)
+            login_resp = self._http._send('POST', "https://www.gradescope.com/login", params=login_data)
         if len(login_resp.history) != 0:
             if login_resp.history[0].status_code == requests.codes.found:
                 self.state = ConnState.LOGGED_IN
+                self._last_login = time.monotonic()
+                if self.session_store:
+                    self.session_store.save(self.session.cookies)
                 return True
         else:
+            self.state = ConnState.INIT
             return False
+
+    def _reauth(self, sent_at: float) -> bool:
+        '''
+        Log in again after a request sent at `sent_at` hit an expired session.
+        Concurrent callers share a single login.
+        '''
+        with self._login_lock:
+            if self._last_login > sent_at:
+                return True     # another request already logged in again
+            log.info('Gradescope session expired, logging in again.')
+            self.state = ConnState.INIT
+            return bool(self.login())
     
+    def _client(self, client_cls):
+        return client_cls(self.session, reauth=self._reauth, cache=self.response_cache,
+                          parser=self.parser, rate_limiter=self.rate_limiter,
+                          retry=self.retry, timeout=self.timeout, parse_pool=self.parse_pool)
+
     @_ensure_login
-    def get_courses(self):
-        with CourseClient(self.session) as client:
-            return client.get_courses()
+    def get_courses(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        '''
+        Courses matching `course_filter` (all courses by default), served from
+        the course catalog while it is fresh.
+        '''
+        return self.course_catalog.get(course_filter)
+
+    def invalidate_courses(self) -> None:
+        self.course_catalog.invalidate()
+
+    def _fetch_courses(self, course_filter: CourseFilter = None) -> GetCoursesResult:
+        with CALL_SECONDS.time(call='get_courses'), span('gradescope.get_courses'), \
+                self._client(CourseClient) as client:
+            return client.get_courses(course_filter)
 
     @_ensure_login
     def get_assignments(self, course_id: str):
-        with AssignmentClient(self.session) as client:
+        with CALL_SECONDS.time(call='get_assignments'), span('gradescope.get_assignments', course_id=course_id), \
+                self._client(AssignmentClient) as client:
             return client.get_assignments(course_id)
+
+    @_ensure_login
+    def iter_assignments(self, course_id: str) -> t.Iterator[Assignment]:
+        '''
+        Assignments of a course, yielded while the page is still downloading.
+        '''
+        with self._client(AssignmentClient) as client:
+            yield from client.iter_assignments(course_id)
+
+    @_ensure_login
+    def get_assignments_many(self, course_ids: t.Iterable[str],
+                             max_workers: int = DEFAULT_MAX_WORKERS) -> t.List[GetAssignmentsResult]:
+        '''
+        Fetch assignments of several courses concurrently over the logged-in session.
+        Results follow the order of `course_ids`. A course that fails to scrape yields
+        a result with no assignments and `error` set instead of aborting the others.
+        '''
+        def fetch(course_id):
+            try:
+                with CALL_SECONDS.time(call='get_assignments'), span('gradescope.get_assignments', course_id=course_id), \
+                        self._client(AssignmentClient) as client:
+                    return client.get_assignments(course_id)
+            except Exception as e:
+                log.warning(f'Failed to get assignments: course_id={course_id} error={e!r}')
+                return GetAssignmentsResult(course_id=course_id, assignments=[], error=e)
+
+        return self._map_concurrent(fetch, course_ids, max_workers)
+
+    @_ensure_login
+    def get_submission_results(self, assignments: t.Iterable[Assignment], per_question: bool = False,
+                               max_workers: int = DEFAULT_MAX_WORKERS) -> t.List[SubmissionResult]:
+        '''
+        Scores of the graded assignments among `assignments`, in their order.
+        Scores come from the scraped course pages; with `per_question` the
+        submission pages are fetched too, at most `max_workers` at a time, but
+        only for submissions that are not in `submission_cache` or were
+        regraded since. A submission that fails to fetch keeps its score
+        without question results.
+        '''
+        graded = [a for a in assignments if a.submission_status == SubmissionStatus.GRADED]
+        if not per_question:
+            return [SubmissionResult.from_assignment(a) for a in graded]
+
+        results = [self.submission_cache.get(a) if needs_fetch(a) else SubmissionResult.from_assignment(a)
+                   for a in graded]
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        def fetch(i):
+            assignment = graded[i]
+            try:
+                with CALL_SECONDS.time(call='get_submission'), \
+                        span('gradescope.get_submission', submission_id=assignment.submission_id), \
+                        self._client(SubmissionClient) as client:
+                    result = client.get_submission(assignment)
+            except Exception as e:
+                log.warning(f'Failed to get submission: submission_id={assignment.submission_id} error={e!r}')
+                return SubmissionResult.from_assignment(assignment)
+            self.submission_cache.put(result)
+            return result
+
+        for i, result in zip(missing, self._map_concurrent(fetch, missing, max_workers)):
+            results[i] = result
+        log.debug(f'Submission results: graded={len(graded)} fetched={len(missing)}')
+        self.submission_cache.save()
+        return results
+
+    @staticmethod
+    def _map_concurrent(fn: t.Callable[[t.Any], t.Any], items: t.Iterable, max_workers: int) -> t.List[t.Any]:
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+            # each call runs in a copy of the caller's context so tracing spans nest under it
+            futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+            return [future.result() for future in futures]
     
     @staticmethod
     def to_datetime_object(datetime_str: str) -> datetime:
         # Gradescope datetime string should be in this format: YYYY-MM-DD HH:MM:SS z
-        return datetime.strptime(datetime_str, "%Y-%m-%d %H:%M:%S %z")
\ No newline at end of file
+        return parse_datetime(datetime_str)
\ No newline at end of file
@@ -0,0 +1,54 @@
+import os
+import typing as t
+from bs4 import BeautifulSoup, SoupStrainer
+
+# env override for the BeautifulSoup tree builder, e.g. "lxml" or "html.parser"
+PARSER_ENV = 'GS_HTML_PARSER'
+
+def _default_features() -> str:
+    if (features := os.getenv(PARSER_ENV)):
+        return features
+    try:
+        import lxml     # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+def _has_class(attrs, cls) -> bool:
+    classes = attrs.get('class') or ''
+    if isinstance(classes, str):
+        classes = classes.split()
+    return cls in classes
+
+ASSIGNMENT_TABLE_ID = 'assignments-student-table'
+
+# Only the parts of a page that are scraped are built into the tree.
+ASSIGNMENT_TABLE = SoupStrainer('table', attrs={'id': ASSIGNMENT_TABLE_ID})
+LOGIN_FORM = SoupStrainer('form', attrs={'action': '/login'})
+# graded submission page, its results are in the JSON props of a React component
+SUBMISSION_VIEWER = SoupStrainer('div', attrs={'data-react-class': 'AssignmentSubmissionViewer'})
+
+# course dashboard headings and the course lists that directly follow them
+COURSE_LISTS = SoupStrainer(
+    lambda name, attrs: (name == 'h1' and _has_class(attrs, 'pageHeading'))
+        or (name == 'div' and _has_class(attrs, 'courseList')))
+
+class ParserBackend:
+    '''
+    Builds BeautifulSoup trees with a configurable tree builder. The lxml builder
+    is used when installed, the pure-Python `html.parser` otherwise. With
+    `strain=False` strainers are ignored and whole pages are built, e.g. to
+    check that straining does not change what is scraped.
+    '''
+
+    def __init__(self, features: str = None, strain: bool = True) -> None:
+        self.features = features or _default_features()
+        self.strain = strain
+
+    def parse(self, html: t.Union[str, bytes], parse_only: SoupStrainer = None) -> BeautifulSoup:
+        return BeautifulSoup(html, self.features, parse_only=parse_only if self.strain else None)
+
+    def __repr__(self) -> str:
+        return f'<ParserBackend features={self.features} strain={self.strain}>'
+
+default_backend = ParserBackend()
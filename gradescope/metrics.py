@@ -0,0 +1,167 @@
+import time
+import threading
+import typing as t
+import logging as log
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LabelValues = t.Tuple[str, ...]
+
+def _format_labels(names: t.Sequence[str], values: t.Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    '''
+    Monotonic count, optionally split by labels.
+    '''
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: t.Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> t.Iterator[t.Tuple[str, str, float]]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}_total', _format_labels(self.labelnames, key), value
+
+class Histogram:
+    '''
+    Distribution of observed durations in cumulative buckets, plus their count and sum.
+    '''
+    type = 'histogram'
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name: str, documentation: str, labelnames: t.Sequence[str] = (),
+                 buckets: t.Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values: t.Dict[LabelValues, t.List[float]] = {}   # bucket counts, then the sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            values = self._values.setdefault(key, [0] * len(self.buckets) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        '''Observe the duration of the `with` block, also when it raises.'''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> t.Iterator[t.Tuple[str, str, float]]:
+        with self._lock:
+            values = {key: list(v) for key, v in self._values.items()}
+        for key, counts in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                yield f'{self.name}_bucket', labels, count
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_count', labels, counts[-2]
+            yield f'{self.name}_sum', labels, counts[-1]
+
+Metric = t.Union[Counter, Histogram]
+
+class Registry:
+    '''
+    Metrics of the process, rendered in the Prometheus text format.
+    '''
+
+    def __init__(self) -> None:
+        self._metrics: t.Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            # defining the same metric twice, e.g. from two modules, returns the first one
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: t.Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: t.Sequence[str] = (),
+                  buckets: t.Sequence[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> t.Dict[str, float]:
+        '''Counter totals and histogram counts/sums, keyed by sample name and labels.'''
+        return {f'{name}{labels}': value
+                for metric in list(self._metrics.values())
+                for name, labels, value in metric.samples()
+                if not name.endswith('_bucket')}
+
+REGISTRY = Registry()
+
+def cycle_summary(before: t.Dict[str, float], after: t.Dict[str, float]) -> t.Dict[str, float]:
+    '''What changed between two snapshots, e.g. taken around one sync cycle.'''
+    summary = {}
+    for key, value in after.items():
+        if (delta := value - before.get(key, 0)):
+            summary[key] = round(delta, 6)
+    return summary
+
+def start_http_server(port: int, addr: str = '0.0.0.0', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    '''
+    Serve `registry` on http://addr:port/metrics from a daemon thread.
+    '''
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug(f'Metrics request: {format % args}')
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    log.info(f'Serving metrics on {addr}:{port}/metrics')
+    return server
@@ -0,0 +1,106 @@
+import os
+import threading
+import multiprocessing
+import typing as t
+import logging as log
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+   from html_parser import ParserBackend
+   from course import CourseClient, CourseFilter, GetCoursesResult
+   from assignment import AssignmentClient, GetAssignmentsResult
+except ModuleNotFoundError:
+   from .html_parser import ParserBackend
+   from .course import CourseClient, CourseFilter, GetCoursesResult
+   from .assignment import AssignmentClient, GetAssignmentsResult
+
+# env override for the number of parse processes, 0 parses in the calling thread
+PROCESSES_ENV = 'GS_PARSE_PROCESSES'
+
+# per worker process, set up once by `_init_worker`
+_worker_parser: t.Optional[ParserBackend] = None
+
+def _init_worker(features: str) -> None:
+    global _worker_parser
+    _worker_parser = ParserBackend(features)
+
+def _decode(content: bytes, encoding: t.Optional[str]) -> str:
+    return content.decode(encoding or 'utf-8', errors='replace')
+
+def _parse_assignments(course_id: str, content: bytes, encoding: str = None) -> GetAssignmentsResult:
+    client = AssignmentClient(parser=_worker_parser)
+    return client._parse_assignments(course_id, _decode(content, encoding))
+
+def _parse_courses(content: bytes, encoding: str = None, course_filter: CourseFilter = None) -> GetCoursesResult:
+    client = CourseClient(parser=_worker_parser)
+    return client._parse_courses(_decode(content, encoding), course_filter)
+
+class ParsePool:
+    '''
+    Parses pages in worker processes, so parsing many courses uses every core
+    instead of contending for the GIL. Workers receive the raw response bytes
+    and send back the parsed results; `Assignment`s pickle as their raw
+    fields. The processes are started on first use and reused until
+    `shutdown()`. Share one pool between Gradescope instances.
+
+    Workers are spawned, so the main module must guard its entry point with
+    `if __name__ == '__main__':`.
+    '''
+
+    def __init__(self, max_workers: int = None, parser: ParserBackend = None) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parser = parser or ParserBackend()
+        self._executor: t.Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> t.Optional['ParsePool']:
+        '''A pool sized by `GS_PARSE_PROCESSES`, None when unset or 0.'''
+        if not (processes := int(os.getenv(PROCESSES_ENV) or 0)):
+            return None
+        return cls(max_workers=processes)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawned rather than forked, forking a process with running threads can deadlock
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker, initargs=(self.parser.features,))
+                log.info(f'Started {self.max_workers} parse processes.')
+            return self._executor
+
+    def _run(self, fn, *args):
+        executor = self._pool()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # a worker died, e.g. killed for memory; start new ones on next use
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def parse_assignments(self, course_id: str, content: bytes, encoding: str = None) -> GetAssignmentsResult:
+        return self._run(_parse_assignments, course_id, content, encoding)
+
+    def parse_courses(self, content: bytes, encoding: str = None,
+                      course_filter: CourseFilter = None) -> GetCoursesResult:
+        return self._run(_parse_courses, content, encoding, course_filter)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def __repr__(self) -> str:
+        return f'<ParsePool max_workers={self.max_workers} started={self._executor is not None}>'
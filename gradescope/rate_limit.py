@@ -0,0 +1,94 @@
+import time
+import random
+import threading
+import typing as t
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+class TokenBucket:
+    '''
+    Allows `rate` requests per second on average with bursts of up to `burst`.
+    '''
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        '''Take a token and return how many seconds to wait before using it.'''
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self) -> None:
+        if (wait := self.reserve()) > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        '''Hold back every request for `seconds`, e.g. after the server asked to slow down.'''
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class RateLimiter:
+    '''
+    One token bucket per host, shared by every client it is passed to.
+    '''
+
+    def __init__(self, rate: float = 2.0, burst: int = 5) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._buckets: t.Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+class RetryPolicy:
+    '''
+    Which failures to retry and how long to wait in between: the server's
+    Retry-After when given, full-jitter exponential backoff otherwise.
+    '''
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, max_retries: int = 4, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 retry_statuses: t.Iterable[int] = RETRY_STATUSES) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = set(retry_statuses)
+
+    def should_retry(self, status_code: int, attempt: int) -> bool:
+        return attempt < self.max_retries and status_code in self.retry_statuses
+
+    def delay(self, attempt: int, headers: t.Mapping[str, str] = None) -> float:
+        if headers and (retry_after := self.retry_after(headers.get('Retry-After'))) is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def retry_after(value: t.Optional[str]) -> t.Optional[float]:
+        '''Seconds to wait from a Retry-After header, given in seconds or as an HTTP date.'''
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,56 @@
+import os
+import json
+import logging as log
+from http.cookiejar import CookieJar
+from requests.cookies import create_cookie
+
+try:
+   from atomic_file import atomic_write
+except ModuleNotFoundError:
+   from .atomic_file import atomic_write
+
+
+class SessionStore:
+    '''
+    On-disk store for Gradescope session cookies so a logged-in session
+    survives across sync cycles and process restarts.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def load(self, jar: CookieJar) -> bool:
+        '''Load stored cookies into `jar`. Returns True if any were loaded.'''
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                cookies = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f'Failed to load session cookies from {self.path}: {e!r}')
+            return False
+
+        for c in cookies:
+            jar.set_cookie(create_cookie(
+                c['name'], c['value'],
+                domain=c.get('domain') or '', path=c.get('path', '/'),
+                expires=c.get('expires'), secure=c.get('secure', False)))
+        return len(cookies) > 0
+
+    def save(self, jar: CookieJar) -> None:
+        if not self.path:
+            return
+        cookies = [{
+            'name': c.name,
+            'value': c.value,
+            'domain': c.domain,
+            'path': c.path,
+            'expires': c.expires,
+            'secure': c.secure,
+        } for c in jar]
+
+        atomic_write(self.path, json.dumps(cookies))
+
+    def clear(self) -> None:
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
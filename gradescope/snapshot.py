@@ -0,0 +1,100 @@
+import typing as t
+import logging as log
+from datetime import datetime, timezone
+
+try:
+   from course import Course, CourseFilter
+   from assignment import Assignment, GetAssignmentsResult
+   from metrics import REGISTRY
+   from gradescope import Gradescope
+except ModuleNotFoundError:
+   from .course import Course, CourseFilter
+   from .assignment import Assignment, GetAssignmentsResult
+   from .metrics import REGISTRY
+   from .gradescope import Gradescope
+
+if t.TYPE_CHECKING:     # the scheduler builds on this package, so it is only imported for annotations
+   from scheduler.scheduler import PollScheduler
+
+ASSIGNMENTS_SCRAPED = REGISTRY.counter('assignments_scraped', 'Assignments scraped from Gradescope.')
+SYNC_ERRORS = REGISTRY.counter(
+    'sync_errors', 'Errors during sync cycles: failed course scrapes (scrape) and task mutations (tasks).',
+    ('stage',))
+
+class Snapshot:
+    '''
+    The selected courses and their assignments as of one scrape. Courses the
+    scheduler did not poll this cycle, or that failed to scrape, keep their
+    last successful result; `polled` lists the courses scraped for this one
+    and `errors` those of them that failed.
+    '''
+
+    def __init__(self, courses: t.Dict[str, Course],
+                 results: t.Dict[str, GetAssignmentsResult],
+                 polled: t.List[str],
+                 errors: t.Dict[str, Exception] = None,
+                 taken_at: datetime = None) -> None:
+        self.courses = courses          # selected courses by course ID
+        self.results = results          # last successful result per course
+        self.polled = polled            # courses scraped for this snapshot
+        self.errors = errors or {}      # polled courses whose scrape failed, by course ID
+        self.taken_at = taken_at or datetime.now(timezone.utc)
+
+    def course_results(self) -> t.List[t.Tuple[Course, GetAssignmentsResult]]:
+        '''Courses in dashboard order with their result, courses never scraped are left out.'''
+        return [(course, self.results[cid]) for cid, course in self.courses.items() if cid in self.results]
+
+    def assignments(self, polled_only: bool = False) -> t.List[Assignment]:
+        '''Assignments of the courses with a result, only those scraped for this snapshot if `polled_only`.'''
+        course_ids = self.scraped if polled_only else self.results
+        return [a for cid in course_ids for a in self.results[cid].assignments]
+
+    @property
+    def scraped(self) -> t.Dict[str, t.Set[str]]:
+        '''Keys of every assignment per course scraped successfully for this snapshot.'''
+        return {cid: {a.cid + a.aid for a in self.results[cid].assignments}
+                for cid in self.polled if cid not in self.errors}
+
+    def __repr__(self) -> str:
+        return (f'<Snapshot courses={len(self.courses)} polled={len(self.polled)} '
+                f'errors={len(self.errors)} taken_at={self.taken_at.isoformat()}>')
+
+def take_snapshot(gs: Gradescope,
+                  course_filter: CourseFilter,
+                  scheduler: 'PollScheduler' = None,
+                  max_workers: int = Gradescope.DEFAULT_MAX_WORKERS,
+                  previous: Snapshot = None) -> Snapshot:
+    '''
+    Scrape the selected courses, only those due when a scheduler is given.
+    Results of courses not polled or failing to scrape are carried over from
+    `previous`.
+    '''
+    courses: t.Dict[str, Course] = gs.get_courses(course_filter).student_courses
+
+    # only poll the courses the scheduler considers due
+    course_ids = list(courses)
+    if scheduler:
+        scheduler.sync_courses(course_ids)
+        course_ids = scheduler.due_courses()
+        if not course_ids:
+            log.debug('No course due for polling.')
+
+    results = {cid: res for cid, res in (previous.results if previous else {}).items() if cid in courses}
+    errors = {}
+    for res in gs.get_assignments_many(course_ids, max_workers=max_workers):
+        if scheduler:
+            scheduler.record(res)
+        if res.error:
+            # the last good result stays, so a transient error does not drop the course from the digest
+            log.warning(f'Skipping course {res.course_id}: {res.error!r}')
+            SYNC_ERRORS.inc(stage='scrape')
+            errors[res.course_id] = res.error
+            continue
+        ASSIGNMENTS_SCRAPED.inc(len(res.assignments))
+        results[res.course_id] = res
+
+    snapshot = Snapshot(courses, results, course_ids, errors)
+    # a course that fails to scrape may have been dropped, re-read the course list next cycle
+    if snapshot.errors:
+        gs.invalidate_courses()
+    return snapshot
@@ -0,0 +1,169 @@
+import os
+import json
+import threading
+import typing as t
+import logging as log
+
+try:
+   from client import Client
+   from assignment import Assignment, SubmissionStatus
+   from html_parser import SUBMISSION_VIEWER
+   from tracing import span
+   from atomic_file import atomic_write
+except ModuleNotFoundError:
+   from .client import Client
+   from .assignment import Assignment, SubmissionStatus
+   from .html_parser import SUBMISSION_VIEWER
+   from .tracing import span
+   from .atomic_file import atomic_write
+
+def _to_float(value) -> t.Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class QuestionResult:
+    __slots__ = ('qid', 'title', 'points', 'max_points')
+
+    def __init__(self, qid, title, points, max_points) -> None:
+        self.qid = qid
+        self.title = title
+        self.points = points            # None while the question is ungraded
+        self.max_points = max_points
+
+    def to_dict(self) -> dict:
+        return {'qid': self.qid, 'title': self.title, 'points': self.points, 'max_points': self.max_points}
+
+    def __repr__(self) -> str:
+        return f'<QuestionResult id={self.qid} {self.points}/{self.max_points}>'
+
+class SubmissionResult:
+    '''
+    Graded result of a submission: its score as shown in the course page and,
+    when the submission page was fetched, the results per question.
+    '''
+    __slots__ = ('cid', 'aid', 'sid', 'score', 'points', 'max_points', 'questions')
+
+    def __init__(self, cid, aid, sid, score, points, max_points,
+                 questions: t.Optional[t.List[QuestionResult]] = None) -> None:
+        self.cid = cid
+        self.aid = aid
+        self.sid = sid
+        self.score = score              # raw score text of the course page, e.g. "9.5 / 10.0"
+        self.points = points
+        self.max_points = max_points
+        self.questions = questions      # None when per-question results were not fetched
+
+    @classmethod
+    def from_assignment(cls, assignment: Assignment, questions: t.List[QuestionResult] = None):
+        return cls(assignment.cid, assignment.aid, assignment.submission_id, assignment.score,
+                   assignment.points, assignment.max_points, questions)
+
+    @property
+    def key(self) -> t.Tuple[str, str, str]:
+        return (self.cid, self.aid, self.sid)
+
+    def to_dict(self) -> dict:
+        return {
+            'cid': self.cid, 'aid': self.aid, 'sid': self.sid,
+            'score': self.score, 'points': self.points, 'max_points': self.max_points,
+            'questions': [q.to_dict() for q in self.questions] if self.questions is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        questions = data.get('questions')
+        return cls(data['cid'], data['aid'], data['sid'], data.get('score'),
+                   data.get('points'), data.get('max_points'),
+                   [QuestionResult(**q) for q in questions] if questions is not None else None)
+
+    def __repr__(self) -> str:
+        return f'<SubmissionResult id={self.sid} {self.points}/{self.max_points}>'
+
+class SubmissionCache:
+    '''
+    Fetched submission results keyed by course, assignment and submission ID.
+    An entry stays valid while the course page shows the same score for the
+    submission; a resubmission gets a new ID and a regrade a new score.
+    Persisted to `path` when given, so cron runs share it.
+    '''
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self._entries: t.Dict[t.Tuple[str, str, str], SubmissionResult] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                entries = [SubmissionResult.from_dict(d) for d in json.load(f)]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning(f'Failed to load submission cache from {self.path}: {e!r}')
+            return
+        self._entries = {r.key: r for r in entries}
+
+    def get(self, assignment: Assignment) -> t.Optional[SubmissionResult]:
+        '''The cached result of the assignment's submission, unless it was regraded since.'''
+        with self._lock:
+            result = self._entries.get((assignment.cid, assignment.aid, assignment.submission_id))
+        if result is None or result.score != assignment.score:
+            return None
+        return result
+
+    def put(self, result: SubmissionResult) -> None:
+        with self._lock:
+            self._entries[result.key] = result
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            data = [r.to_dict() for r in self._entries.values()]
+            self._dirty = False
+        atomic_write(self.path, json.dumps(data))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def needs_fetch(assignment: Assignment) -> bool:
+    '''Whether the assignment has a graded submission whose page can be read.'''
+    return assignment.submission_status == SubmissionStatus.GRADED and assignment.submission_id is not None
+
+class SubmissionClient(Client):
+    PAGE = 'submissions'
+
+    def get_submission(self, assignment: Assignment) -> SubmissionResult:
+        '''Results per question of the graded submission of `assignment`.'''
+        endpoint = f'/courses/{assignment.cid}/assignments/{assignment.aid}/submissions/{assignment.submission_id}'
+        return self._get_parsed(endpoint, lambda resp: self._parse_submission(assignment, resp.text))
+
+    def _parse_submission(self, assignment: Assignment, html) -> SubmissionResult:
+        with span('parse.soup', page=self.PAGE):
+            viewer = self.parser.parse(html, parse_only=SUBMISSION_VIEWER).find('div')
+        if viewer is None or not viewer.get('data-react-props'):
+            raise Exception('Submission results not found')
+        with span('parse.extract', page=self.PAGE):
+            return self._extract_submission(assignment, json.loads(viewer['data-react-props']))
+
+    def _extract_submission(self, assignment: Assignment, props: dict) -> SubmissionResult:
+        scores = {str(q.get('question_id')): _to_float(q.get('score'))
+                  for q in props.get('question_submissions') or []}
+
+        questions = []
+        for q in props.get('questions') or []:
+            qid = str(q.get('id'))
+            questions.append(QuestionResult(
+                qid, q.get('full_title') or q.get('title'), scores.get(qid), _to_float(q.get('weight'))))
+
+        result = SubmissionResult.from_assignment(assignment, questions)
+        # the submission page is authoritative when it carries the totals
+        if (points := _to_float((props.get('assignment_submission') or {}).get('score'))) is not None:
+            result.points = points
+        if (max_points := _to_float((props.get('assignment') or {}).get('total_points'))) is not None:
+            result.max_points = max_points
+        return result
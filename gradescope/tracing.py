@@ -0,0 +1,189 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+import typing as t
+import logging as log
+from collections import Counter
+from contextvars import ContextVar
+
+class Span:
+    '''
+    A timed section of a traced cycle. Spans opened while another span is
+    current become its children, also across threads that copied the context.
+    '''
+    __slots__ = ('name', 'attrs', 'children', 'started', 'duration', '_token')
+
+    def __init__(self, name: str, attrs: dict) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.children: t.List['Span'] = []
+        self.started = None
+        self.duration = None
+        self._token = None
+
+    def __enter__(self):
+        if (parent := _current_span.get()) is not None:
+            parent.children.append(self)
+        self._token = _current_span.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        _current_span.reset(self._token)
+
+    def walk(self, depth: int = 0) -> t.Iterator[t.Tuple[int, 'Span']]:
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def format(self) -> str:
+        '''The span tree, one indented line per span.'''
+        lines = []
+        for depth, span in self.walk():
+            attrs = ' '.join(f'{k}={v}' for k, v in span.attrs.items())
+            duration = f'{span.duration * 1000:.1f}ms' if span.duration is not None else 'unfinished'
+            lines.append(f'{"  " * depth}{span.name} {duration} {attrs}'.rstrip())
+        return '\n'.join(lines)
+
+    def collapsed(self) -> t.Dict[str, int]:
+        '''Self time per span path in microseconds, in collapsed-stack form.'''
+        stacks = {}
+        def visit(span: Span, prefix: str):
+            path = f'{prefix};{span.name}' if prefix else span.name
+            children = sum(c.duration or 0 for c in span.children)
+            stacks[path] = stacks.get(path, 0) + max(0, int(((span.duration or 0) - children) * 1e6))
+            for child in span.children:
+                visit(child, path)
+        visit(self, '')
+        return stacks
+
+    def __repr__(self) -> str:
+        return f'<Span name={self.name} duration={self.duration}>'
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return None
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[t.Optional[Span]] = ContextVar('gradescope_span', default=None)
+
+def span(name: str, **attrs):
+    '''
+    Context manager timing a section of the current trace. Outside a trace it
+    returns a shared no-op, so instrumented code costs one context lookup.
+    '''
+    if _current_span.get() is None:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+def trace(name: str, **attrs) -> Span:
+    '''Start a root span; use as `with trace('cycle') as root:`.'''
+    return Span(name, attrs)
+
+def write_collapsed(path: str, stacks: t.Dict[str, int]) -> None:
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            if count:
+                f.write(f'{stack} {count}\n')
+
+class StackSampler:
+    '''
+    Samples the Python stacks of all threads at a fixed interval, for
+    flamegraph.pl / speedscope compatible collapsed stacks.
+    '''
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.stacks: t.Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(self._frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+class CycleProfiler:
+    '''
+    Profiles the sync cycle selected by `GS_PROFILE_CYCLE` (1-based, or `all`),
+    writing into `GS_PROFILE_DIR`:
+
+    - `cycle-N.pstats`: cProfile dump of the cycle's main thread, for pstats/snakeviz
+    - `cycle-N.collapsed`: sampled stacks of all threads, for flamegraph.pl/speedscope
+    - `cycle-N.spans.collapsed`: self time of the tracing spans in microseconds
+
+    `GS_TRACE=1` logs the span tree of every cycle without profiling.
+    '''
+    PROFILE_CYCLE_ENV = 'GS_PROFILE_CYCLE'
+    PROFILE_DIR_ENV = 'GS_PROFILE_DIR'
+    TRACE_ENV = 'GS_TRACE'
+
+    def __init__(self, profile_cycle: str = None, profile_dir: str = None, trace_spans: bool = None) -> None:
+        self.profile_cycle = profile_cycle if profile_cycle is not None else os.getenv(self.PROFILE_CYCLE_ENV)
+        self.profile_dir = profile_dir or os.getenv(self.PROFILE_DIR_ENV, 'logs/profile')
+        self.trace_spans = trace_spans if trace_spans is not None else os.getenv(self.TRACE_ENV) == '1'
+        self.cycle = 0
+
+    def _profiling(self) -> bool:
+        return bool(self.profile_cycle) and self.profile_cycle in ('all', str(self.cycle))
+
+    def run(self, fn: t.Callable[..., t.Any], *args, **kwargs):
+        '''Run one cycle, traced and/or profiled as configured.'''
+        self.cycle += 1
+        profiling = self._profiling()
+        if not profiling and not self.trace_spans:
+            return fn(*args, **kwargs)
+
+        profiler = sampler = None
+        if profiling:
+            profiler, sampler = cProfile.Profile(), StackSampler()
+            sampler.start()
+            profiler.enable()
+        try:
+            with trace('cycle', n=self.cycle) as root:
+                return fn(*args, **kwargs)
+        finally:
+            if profiling:
+                profiler.disable()
+                sampler.stop()
+                self._dump(profiler, sampler, root)
+            if self.trace_spans:
+                log.info(f'Cycle trace:\n{root.format()}')
+
+    def _dump(self, profiler: cProfile.Profile, sampler: StackSampler, root: Span) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        prefix = os.path.join(self.profile_dir, f'cycle-{self.cycle}')
+        profiler.dump_stats(f'{prefix}.pstats')
+        write_collapsed(f'{prefix}.collapsed', sampler.stacks)
+        write_collapsed(f'{prefix}.spans.collapsed', root.collapsed())
+        log.info(f'Wrote profile of cycle {self.cycle} to {prefix}.*')
@@ -0,0 +1,37 @@
+import os
+import sys
+from dotenv import load_dotenv
+import logging
+
+from runner.runner import MultiAccountRunner, load_accounts
+from gradescope.rate_limit import RateLimiter
+from gradescope.parse_pool import ParsePool
+from gradescope.metrics import start_http_server
+
+load_dotenv()
+
+if __name__ == "__main__":
+    # Set up logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s | %(levelname)-8s | %(threadName)s | %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout), # Log to stdout
+            logging.FileHandler('logs/multi_account.log')
+        ]
+    )
+
+    if (metrics_port := os.getenv('METRICS_PORT')):
+        start_http_server(int(metrics_port))
+
+    accounts = load_accounts(os.getenv('ACCOUNTS_FILE', 'accounts.json'))
+    logging.info(f'Loaded {len(accounts)} account(s).')
+
+    runner = MultiAccountRunner(
+        accounts,
+        max_workers=int(os.getenv('MAX_ACCOUNT_WORKERS', 8)),
+        rate_limiter=RateLimiter(
+            rate=float(os.getenv('GS_RATE_LIMIT', 2.0)),
+            burst=int(os.getenv('GS_RATE_BURST', 5))),
+        parse_pool=ParsePool.from_env())
+    runner.run_forever()
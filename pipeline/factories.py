@@ -0,0 +1,47 @@
+import os
+import json
+import logging as log
+from datetime import datetime, timezone, timedelta
+
+from task.task import GSTaskClient
+from task.retention import RetentionPolicy, TaskPruner
+from gradescope.gradescope import Gradescope
+from gradescope.metrics import REGISTRY, cycle_summary
+
+
+def make_gradescope() -> Gradescope:
+    return Gradescope.from_env()
+
+def make_task_client() -> GSTaskClient:
+    client = GSTaskClient(
+        client_secret_file=os.getenv('CLIENT_SECRET_FILE'),
+        token_file=os.getenv('TOKEN_FILE'),
+        tasklist_name='gs_deadlines',
+        state_file=os.getenv('SYNC_STATE_FILE')
+    )
+
+    client.authenticate()       # autheticate
+    client.init_tasklist()      # initiate tasklist, cache existing tasks
+    return client
+
+def make_pruner() -> TaskPruner:
+    def days(name):
+        return timedelta(days=float(value)) if (value := os.getenv(name)) else None
+
+    policy = RetentionPolicy(
+        past_due_after=days('RETENTION_PAST_DUE_DAYS'),
+        completed_after=days('RETENTION_COMPLETED_DAYS'),
+        prune_unselected=os.getenv('RETENTION_PRUNE_UNSELECTED') == '1')
+    return TaskPruner(policy) if policy.enabled else None
+
+def record_cycle_summary(before: dict, seconds: float) -> dict:
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'cycle_seconds': round(seconds, 3),
+        'metrics': cycle_summary(before, REGISTRY.snapshot()),
+    }
+    log.info(f'Cycle summary: {json.dumps(record)}')
+    if (summary_file := os.getenv('METRICS_SUMMARY_FILE')):
+        with open(summary_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    return record
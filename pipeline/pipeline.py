@@ -0,0 +1,85 @@
+import time
+import contextvars
+import typing as t
+import logging as log
+from concurrent.futures import ThreadPoolExecutor
+
+from gradescope.gradescope import Gradescope
+from gradescope.course import CourseFilter
+from gradescope.metrics import REGISTRY
+from gradescope.tracing import span
+from scheduler.scheduler import PollScheduler
+from gradescope.snapshot import Snapshot, take_snapshot
+from pipeline.sinks import Sink
+
+SINK_SECONDS = REGISTRY.histogram('pipeline_sink_seconds', 'Time each sink spent on a snapshot.', ('sink',))
+SINK_ERRORS = REGISTRY.counter('pipeline_sink_errors', 'Sink runs that raised.', ('sink',))
+
+
+class SinkResult:
+    __slots__ = ('sink', 'result', 'error', 'seconds')
+
+    def __init__(self, sink: str, result: t.Any = None, error: Exception = None, seconds: float = 0.0) -> None:
+        self.sink = sink
+        self.result = result        # whatever the sink returned
+        self.error = error          # set when the sink raised
+        self.seconds = seconds
+
+    def __repr__(self) -> str:
+        status = f'error={self.error!r}' if self.error else 'ok'
+        return f'<SinkResult sink={self.sink} {status} seconds={self.seconds:.3f}>'
+
+
+class Pipeline:
+    """
+    Scrapes Gradescope once per cycle and feeds the snapshot to every sink.
+    Sinks run concurrently; one failing or slow sink does not affect the
+    others or the next cycle.
+    """
+
+    def __init__(self, gs: Gradescope,
+                 course_filter: CourseFilter,
+                 sinks: t.Sequence[Sink],
+                 scheduler: PollScheduler = None,
+                 max_workers: int = Gradescope.DEFAULT_MAX_WORKERS) -> None:
+        self.gs = gs
+        self.course_filter = course_filter
+        self.sinks = list(sinks)
+        self.scheduler = scheduler
+        self.max_workers = max_workers
+        self.snapshot: t.Optional[Snapshot] = None     # latest snapshot, carried into the next one
+
+    def run_once(self) -> t.List[SinkResult]:
+        with span('pipeline.snapshot'):
+            self.snapshot = take_snapshot(self.gs, self.course_filter, self.scheduler,
+                                          self.max_workers, previous=self.snapshot)
+        log.info(f'Took {self.snapshot}')
+        return self.feed(self.snapshot)
+
+    def feed(self, snapshot: Snapshot) -> t.List[SinkResult]:
+        """Run every sink on `snapshot`; results follow the order of the sinks."""
+        if not self.sinks:
+            return []
+        with ThreadPoolExecutor(max_workers=len(self.sinks), thread_name_prefix='sink') as executor:
+            # each sink runs in a copy of the caller's context so tracing spans nest under it
+            futures = [executor.submit(contextvars.copy_context().run, self._run_sink, sink, snapshot)
+                       for sink in self.sinks]
+            return [future.result() for future in futures]
+
+    def _run_sink(self, sink: Sink, snapshot: Snapshot) -> SinkResult:
+        started = time.perf_counter()
+        try:
+            with SINK_SECONDS.time(sink=sink.name), span('pipeline.sink', sink=sink.name):
+                result = SinkResult(sink.name, result=sink.consume(snapshot))
+        except Exception as e:
+            log.exception(f'Sink failed: sink={sink.name} error={e!r}')
+            SINK_ERRORS.inc(sink=sink.name)
+            result = SinkResult(sink.name, error=e)
+        result.seconds = time.perf_counter() - started
+        log.info(f'Sink finished: sink={sink.name} seconds={result.seconds:.3f} '
+                 f'{"error=" + repr(result.error) if result.error else "ok"}')
+        return result
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
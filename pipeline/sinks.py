@@ -0,0 +1,80 @@
+import typing as t
+
+import requests
+
+import discord
+from gradescope.snapshot import Snapshot
+from task.task import GSTaskClient
+from task.sync import sync_snapshot
+from task.retention import TaskPruner
+
+
+class Sink:
+    """
+    Consumes the snapshot of each pipeline cycle. Subclasses set `name`, the
+    label of their logs and metrics, and implement `consume`.
+    """
+
+    name = 'sink'
+
+    def consume(self, snapshot: Snapshot) -> t.Any:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__} name={self.name}>'
+
+
+class GoogleTasksSink(Sink):
+    """
+    Pushes the undue assignments of the polled courses to Google Tasks.
+    Returns the failed task keys.
+    """
+
+    name = 'google_tasks'
+
+    def __init__(self, make_client: t.Callable[[], GSTaskClient],
+                 dry_run: bool = False, pruner: TaskPruner = None) -> None:
+        self.make_client = make_client      # e.g. a PersistentTaskClient
+        self.dry_run = dry_run
+        self.pruner = pruner
+
+    def consume(self, snapshot: Snapshot) -> t.Dict[str, Exception]:
+        if not snapshot.polled:
+            return {}
+        return sync_snapshot(self.make_client(), snapshot, dry_run=self.dry_run, pruner=self.pruner)
+
+    def close(self) -> None:
+        if (close := getattr(self.make_client, 'close', None)):
+            close()
+
+
+class DiscordSink(Sink):
+    """
+    Renders the assignment digest of all selected courses and sends it to a
+    Discord webhook, editing the previous message when a digest store is given.
+    Without a store, a digest identical to the previous one is not sent again.
+    Returns 'unchanged', 'edited' or 'posted'.
+    """
+
+    name = 'discord'
+
+    def __init__(self, webhook_url: str, store: discord.DigestStore = None, http=requests) -> None:
+        self.webhook_url = webhook_url
+        self.store = store
+        self.http = http
+        self._last_fingerprint = None
+
+    def consume(self, snapshot: Snapshot) -> str:
+        embeds = discord.render_embeds(snapshot.course_results())
+        if self.store:
+            return discord.send_embeds(embeds, self.webhook_url, self.store, http=self.http)
+
+        current = discord.fingerprint(discord.make_payload(embeds))
+        if current == self._last_fingerprint:
+            return 'unchanged'
+        result = discord.send_embeds(embeds, self.webhook_url, http=self.http)
+        self._last_fingerprint = current
+        return result
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import threading
+import typing as t
+import logging as log
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+
+from gradescope.gradescope import Gradescope
+from gradescope.rate_limit import RateLimiter
+from gradescope.parse_pool import ParsePool
+from scheduler.scheduler import PollScheduler
+from task.task import GSTaskClient, PersistentTaskClient
+from task.sync import sync_tasks
+
+
+class AccountConfig:
+
+    def __init__(self, name, username, password, client_secret_file, token_file,
+                 tasklist_name='gs_deadlines', session_file=None, state_file=None,
+                 term=None, year=None, courses_to_include=None, courses_to_exclude=None,
+                 requests_per_hour=120, max_course_workers=4) -> None:
+        self.name = name                              # label used in logs
+        self.username = username                      # Gradescope username
+        self.password = password                      # Gradescope password
+        self.client_secret_file = client_secret_file  # Google OAuth client secret
+        self.token_file = token_file                  # Google OAuth token, must already be authorized
+        self.tasklist_name = tasklist_name
+        self.session_file = session_file              # optional, persisted Gradescope session
+        self.state_file = state_file                  # optional, SQLite sync state
+        # semester and year displayed on Gradescope, those of the env file when not given
+        self.term = term or os.getenv('COURSES_TERM')
+        self.year = year or os.getenv('COURSES_YEAR')
+        if self.term is None or self.year is None:
+            raise Exception(f'Account {name}: set term and year, or COURSES_TERM and COURSES_YEAR')
+        self.courses_to_include = set(courses_to_include or [])
+        self.courses_to_exclude = set(courses_to_exclude or [])
+        self.requests_per_hour = requests_per_hour    # course fetch budget of this account
+        self.max_course_workers = max_course_workers  # concurrent course fetches of this account
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+    def __repr__(self) -> str:
+        return f'<AccountConfig name={self.name}>'
+
+
+def load_accounts(path: str) -> t.List[AccountConfig]:
+    """
+    Load account configs from a JSON file holding a list of objects with the
+    fields of `AccountConfig`.
+    """
+    with open(path) as f:
+        return [AccountConfig.from_dict(data) for data in json.load(f)]
+
+
+class AccountWorker:
+    """
+    Everything one account syncs with: its own Gradescope session, tasks
+    client and poll schedule. Failures stay within the worker.
+    """
+
+    MAX_BACKOFF = timedelta(hours=1)
+
+    def __init__(self, config: AccountConfig, rate_limiter: RateLimiter = None,
+                 parse_pool: ParsePool = None) -> None:
+        self.config = config
+        self.gs = Gradescope(config.username, config.password, session_file=config.session_file,
+                             rate_limiter=rate_limiter, parse_pool=parse_pool)
+        self.scheduler = PollScheduler(requests_per_hour=config.requests_per_hour)
+        self.tasks = PersistentTaskClient(self.make_task_client)
+        self.next_run = datetime.now(timezone.utc)
+        self.failures = 0
+
+    def make_task_client(self) -> GSTaskClient:
+        # an interactive OAuth flow would block a worker, tokens are provisioned up front
+        if not os.path.exists(self.config.token_file):
+            raise Exception(f'Missing Google token file {self.config.token_file}')
+
+        client = GSTaskClient(
+            client_secret_file=self.config.client_secret_file,
+            token_file=self.config.token_file,
+            tasklist_name=self.config.tasklist_name,
+            state_file=self.config.state_file)
+        client.authenticate()
+        client.init_tasklist()
+        return client
+
+    def run_once(self) -> None:
+        started = time.monotonic()
+        try:
+            if not self.gs.logged_in and not self.gs.login():
+                raise Exception('Invalid Gradescope credentials')
+            sync_tasks(
+                self.gs,
+                make_client=self.tasks,
+                term=self.config.term,
+                year=self.config.year,
+                include=self.config.courses_to_include,
+                exclude=self.config.courses_to_exclude,
+                scheduler=self.scheduler,
+                max_workers=self.config.max_course_workers)
+        except Exception as e:
+            self.failures += 1
+            backoff = min(timedelta(minutes=2 ** self.failures), self.MAX_BACKOFF)
+            log.error(f'Sync failed: account={self.config.name} error={e!r} retry_in={backoff}')
+            # start over with a fresh tasks client, the failure may have left it unusable
+            self.tasks.close()
+            self.next_run = datetime.now(timezone.utc) + backoff
+            return
+        finally:
+            self.scheduler.record_cycle(time.monotonic() - started)
+
+        self.failures = 0
+        self.next_run = datetime.now(timezone.utc) + timedelta(
+            seconds=self.scheduler.seconds_until_next_poll())
+
+    def __repr__(self) -> str:
+        return f'<AccountWorker name={self.config.name} next_run={self.next_run.isoformat()}>'
+
+
+class MultiAccountRunner:
+    """
+    Runs the sync of many accounts on a bounded worker pool. Each account has
+    at most one sync in flight and due accounts are started oldest first, so a
+    busy account cannot starve the others.
+    """
+
+    def __init__(self, accounts: t.Iterable[AccountConfig], max_workers: int = 8,
+                 rate_limiter: RateLimiter = None, parse_pool: ParsePool = None) -> None:
+        # all accounts hit the same host, so they share one request budget
+        self.rate_limiter = rate_limiter or RateLimiter()
+        # and, when given, one set of parse processes
+        self.parse_pool = parse_pool
+        self.workers = [AccountWorker(config, self.rate_limiter, self.parse_pool) for config in accounts]
+        self.max_workers = max_workers
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_forever(self, poll_seconds: float = 5.0) -> None:
+        in_flight: t.Dict[Future, AccountWorker] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stop.is_set():
+                now = datetime.now(timezone.utc)
+                busy = set(in_flight.values())
+                due = sorted((w for w in self.workers if w not in busy and w.next_run <= now),
+                             key=lambda w: w.next_run)
+
+                for worker in due[:self.max_workers - len(in_flight)]:
+                    in_flight[executor.submit(worker.run_once)] = worker
+
+                # wake up when a sync finishes or the next account becomes due
+                idle = [w.next_run for w in self.workers if w not in in_flight.values()]
+                timeout = poll_seconds
+                if idle and len(in_flight) < self.max_workers:
+                    timeout = min(timeout, max(0.0, (min(idle) - now).total_seconds()))
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del in_flight[future]
+                else:
+                    self._stop.wait(timeout)
+
+            wait(in_flight)
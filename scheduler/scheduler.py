@@ -0,0 +1,193 @@
+import random
+import threading
+import typing as t
+import logging as log
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from gradescope.assignment import GetAssignmentsResult
+
+
+class PollPolicy:
+    """
+    Maps the time left until a course's nearest deadline to a poll interval.
+    """
+
+    DEFAULT_TIERS = (
+        (timedelta(hours=2), timedelta(minutes=2)),
+        (timedelta(days=1), timedelta(minutes=10)),
+        (timedelta(days=7), timedelta(hours=1)),
+    )
+    DEFAULT_IDLE_INTERVAL = timedelta(hours=6)      # nothing due within the last tier
+    DEFAULT_ERROR_INTERVAL = timedelta(minutes=5)   # retry delay after a failed scrape
+
+    def __init__(self,
+                 tiers: t.Sequence[t.Tuple[timedelta, timedelta]] = DEFAULT_TIERS,
+                 idle_interval: timedelta = DEFAULT_IDLE_INTERVAL,
+                 error_interval: timedelta = DEFAULT_ERROR_INTERVAL,
+                 jitter: float = 0.1) -> None:
+        self.tiers = sorted(tiers)
+        self.idle_interval = idle_interval
+        self.error_interval = error_interval
+        self.jitter = jitter    # fraction of the interval to randomize by, spreads out polls
+
+    def interval(self, nearest_deadline: t.Optional[datetime], now: datetime) -> timedelta:
+        interval = self.idle_interval
+        if nearest_deadline is not None:
+            for horizon, tier_interval in self.tiers:
+                if nearest_deadline - now <= horizon:
+                    interval = tier_interval
+                    break
+        return self._jittered(interval)
+
+    def _jittered(self, interval: timedelta) -> timedelta:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    @property
+    def tightest_interval(self) -> timedelta:
+        return self.tiers[0][1] if self.tiers else self.idle_interval
+
+
+class CourseSchedule:
+    def __init__(self, cid, next_poll: datetime) -> None:
+        self.cid = cid
+        self.next_poll = next_poll
+        self.last_polled: t.Optional[datetime] = None
+        self.interval: t.Optional[timedelta] = None
+        self.deadlines: t.List[datetime] = []     # upcoming due/late due times, sorted
+
+    @property
+    def nearest_deadline(self) -> t.Optional[datetime]:
+        return self.deadlines[0] if self.deadlines else None
+
+    def __repr__(self) -> str:
+        return f'<CourseSchedule id={self.cid} next_poll={self.next_poll.isoformat()}>'
+
+
+class SchedulerStats:
+    def __init__(self) -> None:
+        self.cycles = 0
+        self.polls = 0
+        self.errors = 0
+        self.deferred = 0               # polls postponed by the request budget
+        self.missed_deadlines = 0       # deadlines that passed without a recent poll
+        self.last_cycle_seconds = None
+        self.max_cycle_seconds = 0.0
+        self.total_cycle_seconds = 0.0
+
+    @property
+    def avg_cycle_seconds(self) -> t.Optional[float]:
+        return self.total_cycle_seconds / self.cycles if self.cycles else None
+
+    def to_dict(self) -> dict:
+        return {
+            'cycles': self.cycles,
+            'polls': self.polls,
+            'errors': self.errors,
+            'deferred': self.deferred,
+            'missed_deadlines': self.missed_deadlines,
+            'last_cycle_seconds': self.last_cycle_seconds,
+            'avg_cycle_seconds': self.avg_cycle_seconds,
+            'max_cycle_seconds': self.max_cycle_seconds,
+        }
+
+
+class PollScheduler:
+    """
+    Plans per-course polls from the deadlines of the last scrape: courses with
+    a deadline coming up are polled often, idle courses rarely. Polls are capped
+    by a global budget of course fetches per hour.
+    """
+
+    def __init__(self,
+                 policy: PollPolicy = None,
+                 requests_per_hour: int = 120,
+                 min_sleep: timedelta = timedelta(seconds=30),
+                 max_sleep: timedelta = timedelta(minutes=30)) -> None:
+        self.policy = policy or PollPolicy()
+        self.requests_per_hour = requests_per_hour
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+
+        self.courses: t.Dict[str, CourseSchedule] = {}
+        self.stats = SchedulerStats()
+        self._sent: t.Deque[datetime] = deque()     # times of budgeted requests in the last hour
+        self._lock = threading.Lock()
+
+    def sync_courses(self, course_ids: t.Iterable[str], now: datetime = None) -> None:
+        """Track newly selected courses (polled right away) and drop deselected ones."""
+        now = now or datetime.now(timezone.utc)
+        course_ids = set(course_ids)
+        with self._lock:
+            for cid in course_ids - self.courses.keys():
+                self.courses[cid] = CourseSchedule(cid, next_poll=now)
+            for cid in self.courses.keys() - course_ids:
+                del self.courses[cid]
+
+    def due_courses(self, now: datetime = None) -> t.List[str]:
+        """Courses to poll now, most overdue first, within the remaining budget."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            due = sorted((s for s in self.courses.values() if s.next_poll <= now),
+                         key=lambda s: s.next_poll)
+            budget = self._remaining_budget(now)
+            if len(due) > budget:
+                self.stats.deferred += len(due) - budget
+                due = due[:budget]
+            self._sent.extend(now for _ in due)
+            return [s.cid for s in due]
+
+    def record(self, result: GetAssignmentsResult, now: datetime = None) -> None:
+        """Reschedule a course from the result of polling it."""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            schedule = self.courses.get(result.course_id)
+            if schedule is None:
+                return
+            self.stats.polls += 1
+
+            if result.error:
+                self.stats.errors += 1
+                schedule.next_poll = now + self.policy.error_interval
+                return
+
+            # deadlines that passed since the previous poll without a poll close to them
+            if schedule.last_polled is not None:
+                window = self.policy.tightest_interval * 2
+                for deadline in schedule.deadlines:
+                    if deadline > now:
+                        break
+                    if deadline - schedule.last_polled > window:
+                        self.stats.missed_deadlines += 1
+
+            schedule.deadlines = sorted(
+                d for a in result.assignments
+                for d in (a.due_at, a.late_due_at) if d is not None and d > now)
+            schedule.last_polled = now
+            schedule.interval = self.policy.interval(schedule.nearest_deadline, now)
+            schedule.next_poll = now + schedule.interval
+            log.debug(f'Scheduled course {result.course_id}: nearest_deadline={schedule.nearest_deadline} '
+                      f'next_poll={schedule.next_poll.isoformat()}')
+
+    def record_cycle(self, seconds: float) -> None:
+        with self._lock:
+            self.stats.cycles += 1
+            self.stats.last_cycle_seconds = seconds
+            self.stats.total_cycle_seconds += seconds
+            self.stats.max_cycle_seconds = max(self.stats.max_cycle_seconds, seconds)
+
+    def seconds_until_next_poll(self, now: datetime = None) -> float:
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            wakeup = now + self.max_sleep
+            if self.courses:
+                wakeup = min(wakeup, min(s.next_poll for s in self.courses.values()))
+            # once the budget is spent, wait for the oldest request to leave the window
+            if self._remaining_budget(now) == 0 and self._sent:
+                wakeup = max(wakeup, self._sent[0] + timedelta(hours=1))
+        return max(wakeup - now, self.min_sleep).total_seconds()
+
+    def _remaining_budget(self, now: datetime) -> int:
+        while self._sent and self._sent[0] <= now - timedelta(hours=1):
+            self._sent.popleft()
+        return max(0, self.requests_per_hour - len(self._sent))
@@ -0,0 +1,123 @@
+import os
+import json
+import threading
+import typing as t
+import logging as log
+from datetime import datetime, timedelta, timezone
+
+from gradescope.atomic_file import atomic_write
+
+
+class TokenManager:
+    """
+    OAuth credentials of the Google Tasks client, loaded from `token_file`
+    and refreshed ahead of expiry by a background thread, so requests never
+    wait on a refresh. The token file is rewritten atomically, and only when
+    the credentials changed.
+    """
+
+    REFRESH_MARGIN = timedelta(minutes=5)       # refresh this long before the token expires
+    RETRY_DELAY = timedelta(seconds=30)         # after a failed refresh, doubling up to the margin
+    IDLE_CHECK = timedelta(hours=1)             # re-check interval for credentials without expiry
+
+    def __init__(self, token_file: str, client_secret_file: str = None,
+                 scopes: t.Sequence[str] = (), refresh_margin: timedelta = REFRESH_MARGIN) -> None:
+        self.token_file = token_file
+        self.client_secret_file = client_secret_file
+        self.scopes = list(scopes)
+        self.refresh_margin = refresh_margin
+
+        self.credentials = None     # google.oauth2.credentials.Credentials
+        self._saved = None          # token file content as last read or written
+        self._request = None        # reused transport for token refreshes
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """
+        Credentials from the token file, refreshed when expired. Without usable
+        credentials the interactive OAuth flow runs.
+        """
+        from google.oauth2.credentials import Credentials
+
+        if os.path.exists(self.token_file):
+            with open(self.token_file) as f:
+                self._saved = f.read()
+            self.credentials = Credentials.from_authorized_user_info(json.loads(self._saved), self.scopes)
+
+        # If there are no (valid) credentials available, let the user log in.
+        if not self.credentials or not self.credentials.valid:
+            if self.credentials and self.credentials.expired and self.credentials.refresh_token:
+                self.refresh()
+            else:
+                from google_auth_oauthlib.flow import InstalledAppFlow
+                flow = InstalledAppFlow.from_client_secrets_file(self.client_secret_file, self.scopes)
+                self.credentials = flow.run_local_server(bind_addr='0.0.0.0', open_browser=False)
+                self._save()
+        return self.credentials
+
+    def refresh(self) -> None:
+        with self._lock:
+            if self._request is None:
+                from google.auth.transport.requests import Request
+                self._request = Request()
+            self.credentials.refresh(self._request)
+            self._save()
+
+    def save(self) -> bool:
+        """Write the credentials if they changed, e.g. refreshed by the API client on its own."""
+        with self._lock:
+            return self._save()
+
+    def _save(self) -> bool:
+        if self.credentials is None:
+            return False
+        data = self.credentials.to_json()
+        if data == self._saved:
+            return False
+
+        atomic_write(self.token_file, data)
+        self._saved = data
+        log.debug(f'Saved Google credentials to {self.token_file}.')
+        return True
+
+    def seconds_until_refresh(self, now: datetime = None) -> float:
+        expiry = self.credentials.expiry if self.credentials else None
+        if expiry is None:
+            return self.IDLE_CHECK.total_seconds()
+        # google-auth keeps expiry as naive UTC
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        return max(0.0, (expiry - self.refresh_margin - now).total_seconds())
+
+    def _run(self) -> None:
+        retry = None
+        while not self._stop.wait(retry.total_seconds() if retry else self.seconds_until_refresh()):
+            if not (self.credentials and self.credentials.refresh_token):
+                retry = self.IDLE_CHECK
+                continue
+            try:
+                self.refresh()
+                retry = None
+                log.debug(f'Refreshed Google credentials, expiry={self.credentials.expiry}')
+            except Exception as e:
+                retry = min(retry * 2, self.refresh_margin) if retry else self.RETRY_DELAY
+                log.warning(f'Failed to refresh Google credentials: error={e!r} retry_in={retry}')
+
+    def start(self) -> None:
+        """Refresh in the background from now on; `load()` first."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __repr__(self) -> str:
+        expiry = self.credentials.expiry if self.credentials else None
+        return f'<TokenManager token_file={self.token_file} expiry={expiry}>'
+
@@ -0,0 +1,109 @@
+import re
+import typing as t
+from enum import Enum
+
+from task.state import canonical_body, fingerprint
+
+NOTES_PATTERN = r"/courses/(\d+)/assignments/(\d+)"
+
+def task_ids(notes) -> t.Optional[t.Tuple[str, str]]:
+    """(course id, assignment id) referenced by the notes of a task."""
+    if notes and (matches := re.findall(NOTES_PATTERN, notes)):
+        return matches[0]
+    return None
+
+
+class Action(Enum):
+    INSERT = 'insert'
+    PATCH = 'patch'
+    SKIP = 'skip'
+    DELETE = 'delete'
+
+
+class PlannedChange:
+    __slots__ = ('action', 'key', 'task_id', 'body', 'reason')
+
+    def __init__(self, action: Action, key: str, task_id: str = None, body: dict = None, reason: str = '') -> None:
+        self.action = action
+        self.key = key
+        self.task_id = task_id      # existing task, None for inserts
+        self.body = body            # body to send, the existing task for deletes, None for skips
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f'<PlannedChange {self.action.value} key={self.key} reason="{self.reason}">'
+
+
+class SyncPlan:
+    """
+    What a sync would do to the tasklist, one entry per task considered.
+    """
+
+    def __init__(self, changes: t.List[PlannedChange] = None) -> None:
+        self.changes = changes or []
+
+    def of(self, action: Action) -> t.List[PlannedChange]:
+        return [c for c in self.changes if c.action == action]
+
+    @property
+    def writes(self) -> t.List[PlannedChange]:
+        return [c for c in self.changes if c.action != Action.SKIP]
+
+    def counts(self) -> t.Dict[str, int]:
+        counts = {action.value: 0 for action in Action}
+        for change in self.changes:
+            counts[change.action.value] += 1
+        return counts
+
+    def format(self, include_skips: bool = False) -> str:
+        """Human readable plan, e.g. for a dry run."""
+        lines = [' '.join(f'{k}={v}' for k, v in self.counts().items())]
+        for change in self.changes:
+            if change.action == Action.SKIP and not include_skips:
+                continue
+            title = (change.body or {}).get('title', '')
+            lines.append(f'  {change.action.value:<6} {change.key} {title} ({change.reason})'.rstrip())
+        return '\n'.join(lines)
+
+    def __repr__(self) -> str:
+        return f'<SyncPlan {self.counts()}>'
+
+
+def plan_sync(desired: t.Dict[str, dict],
+              existing: t.Dict[str, dict],
+              task_id_of: t.Callable[[str], str],
+              scraped: t.Dict[str, t.Set[str]] = None) -> SyncPlan:
+    """
+    Reconcile the task bodies built from Gradescope (`desired`) with the tasks
+    in the tasklist (`existing`, both keyed by task key). Bodies are compared
+    by canonical fingerprint, so formatting the API normalizes away, like the
+    time of day of `due`, never causes a patch.
+
+    `scraped` maps the IDs of courses scraped this cycle to the keys of all
+    their assignments, due or not. An existing task of such a course whose
+    assignment is gone is deleted; tasks of other courses are left alone.
+    """
+    changes = []
+    for key, body in desired.items():
+        if key not in existing:
+            changes.append(PlannedChange(Action.INSERT, key, body=body, reason='not in tasklist'))
+            continue
+
+        if fingerprint(body) == fingerprint(existing[key]):
+            changes.append(PlannedChange(Action.SKIP, key, task_id=task_id_of(key), reason='unchanged'))
+            continue
+
+        want, have = canonical_body(body), canonical_body(existing[key])
+        changed = ', '.join(k for k in want if want[k] != have[k])
+        changes.append(PlannedChange(Action.PATCH, key, task_id=task_id_of(key), body=body,
+                                     reason=f'changed: {changed}'))
+
+    for key, body in existing.items():
+        if key in desired or not scraped or not (ids := task_ids(body.get('notes'))):
+            continue
+        course_id, _ = ids
+        if course_id in scraped and key not in scraped[course_id]:
+            changes.append(PlannedChange(Action.DELETE, key, task_id=task_id_of(key), body=body,
+                                         reason='assignment no longer on Gradescope'))
+
+    return SyncPlan(changes)
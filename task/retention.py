@@ -0,0 +1,127 @@
+import typing as t
+import logging as log
+from datetime import datetime, timedelta, timezone
+
+from gradescope.rate_limit import TokenBucket
+from task.task import GSTaskClient
+from task.reconcile import Action, PlannedChange, SyncPlan, task_ids
+
+
+class RetentionPolicy:
+    """
+    Which synced tasks to remove from the tasklist. Only tasks whose notes
+    link a Gradescope assignment are ever considered; unset rules are off.
+    """
+
+    DEFAULT_INTERVAL = timedelta(days=1)
+
+    def __init__(self,
+                 past_due_after: timedelta = None,
+                 completed_after: timedelta = None,
+                 prune_unselected: bool = False,
+                 interval: timedelta = DEFAULT_INTERVAL,
+                 max_deletes: int = 500,
+                 batches_per_second: float = 1.0) -> None:
+        self.past_due_after = past_due_after        # delete any task this long past its due date
+        self.completed_after = completed_after      # delete completed tasks this long past their due date
+        self.prune_unselected = prune_unselected    # delete tasks of courses no longer selected
+        self.interval = interval                    # time between pruning runs
+        self.max_deletes = max_deletes              # per run, the rest waits for the next run
+        self.batches_per_second = batches_per_second
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.past_due_after or self.completed_after or self.prune_unselected)
+
+    def reason(self, item: dict, course_id: str, now: datetime,
+               selected_courses: t.Optional[t.Set[str]]) -> t.Optional[str]:
+        """Why the task should be deleted, None to keep it."""
+        if self.prune_unselected and selected_courses and course_id not in selected_courses:
+            return 'course no longer selected'
+
+        due = _parse_rfc3339(item.get('due'))
+        if due is None:
+            return None
+        if self.past_due_after and due < now - self.past_due_after:
+            return f'past due for more than {_format_days(self.past_due_after)}'
+        if (self.completed_after and item.get('status') == 'completed'
+                and due < now - self.completed_after):
+            return f'completed and past due for more than {_format_days(self.completed_after)}'
+        return None
+
+    def __repr__(self) -> str:
+        return (f'<RetentionPolicy past_due_after={self.past_due_after} completed_after={self.completed_after} '
+                f'prune_unselected={self.prune_unselected}>')
+
+
+def _format_days(delta: timedelta) -> str:
+    # thresholds may be fractional, e.g. RETENTION_PAST_DUE_DAYS=0.5
+    return f'{delta / timedelta(days=1):g} days'
+
+
+def _parse_rfc3339(value: t.Optional[str]) -> t.Optional[datetime]:
+    if not value:
+        return None
+    # Python 3.10's fromisoformat rejects the 'Z' suffix
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class TaskPruner:
+    """
+    Applies a retention policy to a tasklist at most once per `interval`.
+    Deletes go out as batch requests paced by a token bucket.
+    """
+
+    PRUNE_FIELDS = 'items(id,title,status,due,notes),nextPageToken'
+
+    def __init__(self, policy: RetentionPolicy) -> None:
+        self.policy = policy
+        self.last_run: t.Optional[datetime] = None
+        self._batches = TokenBucket(rate=policy.batches_per_second, burst=1)
+
+    def due(self, now: datetime = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        return self.policy.enabled and (self.last_run is None or now - self.last_run >= self.policy.interval)
+
+    def plan(self, client: GSTaskClient, selected_courses: t.Set[str] = None,
+             keep: t.Set[str] = frozenset(), now: datetime = None) -> SyncPlan:
+        """
+        Deletions for the tasks the policy no longer retains, never for keys in
+        `keep` (e.g. the tasks the current sync wants).
+        """
+        now = now or datetime.now(timezone.utc)
+        params = {'showHidden': True}
+        if not self.policy.prune_unselected:
+            # only old tasks can match, let the API filter the rest
+            horizons = [h for h in (self.policy.past_due_after, self.policy.completed_after) if h]
+            if not horizons:
+                return SyncPlan()
+            params['dueMax'] = (now - min(horizons)).isoformat()
+
+        changes = []
+        for item in client.iter_tasks(fields=self.PRUNE_FIELDS, **params):
+            if not (ids := task_ids(item.get('notes'))):
+                continue
+            key = ids[0] + ids[1]
+            if key in keep:
+                continue
+            if (reason := self.policy.reason(item, ids[0], now, selected_courses)):
+                changes.append(PlannedChange(Action.DELETE, key, task_id=item['id'], body=item, reason=reason))
+                if len(changes) >= self.policy.max_deletes:
+                    break
+        return SyncPlan(changes)
+
+    def prune(self, client: GSTaskClient, selected_courses: t.Set[str] = None,
+              keep: t.Set[str] = frozenset(), dry_run: bool = False) -> t.Dict[str, Exception]:
+        now = datetime.now(timezone.utc)
+        plan = self.plan(client, selected_courses, keep, now)
+        self.last_run = now
+
+        if dry_run:
+            log.info(f'Dry run, planned pruning: {plan.format()}')
+            return {}
+
+        errors = client.apply_plan(plan, rate_limit=self._batches)
+        deleted = sum(1 for change in plan.changes if change.key not in errors)
+        log.info(f'Pruned {deleted} task(s), {len(errors)} failed.')
+        return errors
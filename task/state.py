@@ -0,0 +1,138 @@
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+import typing as t
+
+
+SYNCED_FIELDS = ('title', 'due', 'status', 'notes')
+DATE_PREFIX = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+def canonical_body(task_body: dict) -> dict:
+    """
+    The synced fields of a task body as Google Tasks stores them: `due` keeps
+    only its date, text is stripped and a missing status means needsAction.
+    """
+    due = task_body.get('due')
+    if due and (m := DATE_PREFIX.match(due)):
+        due = m.group(0)
+    title = task_body.get('title')
+    notes = task_body.get('notes')
+    return {
+        'title': title.strip() if title else None,
+        'due': due or None,
+        'status': task_body.get('status') or 'needsAction',
+        'notes': notes.replace('\r\n', '\n').strip() if notes else None,
+    }
+
+def fingerprint(task_body: dict) -> str:
+    """
+    Stable hash of the canonical synced fields of a task body.
+    """
+    canonical = json.dumps(canonical_body(task_body), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+class TaskState:
+    def __init__(self, course_id, assignment_id, task_id, tasklist_id, etag, fingerprint, body) -> None:
+        self.course_id = course_id
+        self.assignment_id = assignment_id
+        self.task_id = task_id              # Google task identifier
+        self.tasklist_id = tasklist_id      # tasklist the task lives in
+        self.etag = etag                    # ETag of the task as last seen
+        self.fingerprint = fingerprint      # fingerprint of the last known task body
+        self.body = body                    # last known title/due/status/notes
+
+    @property
+    def key(self) -> str:
+        return self.course_id + self.assignment_id
+
+    def __repr__(self) -> str:
+        return f'<TaskState key={self.key} task_id={self.task_id}>'
+
+
+class SyncStateStore:
+    """
+    Local SQLite store of what was synced to Google Tasks, so a cycle only has
+    to list the tasks updated since the previous one.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            course_id TEXT NOT NULL,
+            assignment_id TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            tasklist_id TEXT NOT NULL,
+            etag TEXT,
+            fingerprint TEXT,
+            body TEXT,
+            PRIMARY KEY (course_id, assignment_id)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(self.SCHEMA)
+
+    def get_meta(self, key: str) -> t.Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: t.Optional[str]) -> None:
+        with self._lock, self._conn:
+            if value is None:
+                self._conn.execute('DELETE FROM meta WHERE key = ?', (key,))
+            else:
+                self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def get_tasklist_id(self, tasklist_name: str) -> t.Optional[str]:
+        return self.get_meta(f'tasklist:{tasklist_name}')
+
+    def set_tasklist_id(self, tasklist_name: str, tasklist_id: t.Optional[str]) -> None:
+        self.set_meta(f'tasklist:{tasklist_name}', tasklist_id)
+
+    def get_watermark(self, tasklist_id: str) -> t.Optional[str]:
+        """RFC 3339 time of the last incremental refresh of a tasklist."""
+        return self.get_meta(f'watermark:{tasklist_id}')
+
+    def set_watermark(self, tasklist_id: str, updated_min: t.Optional[str]) -> None:
+        self.set_meta(f'watermark:{tasklist_id}', updated_min)
+
+    def upsert(self, course_id, assignment_id, task_id, tasklist_id, etag, task_body: dict) -> None:
+        body = {k: task_body.get(k) for k in SYNCED_FIELDS}
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (course_id, assignment_id, task_id, tasklist_id, etag,
+                 fingerprint(body), json.dumps(body)))
+
+    def delete(self, course_id, assignment_id) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM tasks WHERE course_id = ? AND assignment_id = ?',
+                (course_id, assignment_id))
+
+    def tasks(self, tasklist_id: str) -> t.List[TaskState]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT course_id, assignment_id, task_id, tasklist_id, etag, fingerprint, body '
+                'FROM tasks WHERE tasklist_id = ?', (tasklist_id,)).fetchall()
+        return [TaskState(*row[:6], json.loads(row[6])) for row in rows]
+
+    def reset(self, tasklist_id: str) -> None:
+        """Forget everything about a tasklist so the next refresh is a full scan."""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM tasks WHERE tasklist_id = ?', (tasklist_id,))
+            self._conn.execute('DELETE FROM meta WHERE key = ?', (f'watermark:{tasklist_id}',))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,89 @@
+import typing as t
+import logging as log
+from collections import defaultdict
+from datetime import timezone, datetime as dt
+
+from task.task import GSTaskClient, GTask
+from task.retention import TaskPruner
+from scheduler.scheduler import PollScheduler
+from gradescope.gradescope import Gradescope
+from gradescope.course import CourseFilter
+from gradescope.assignment import Assignment, SubmissionStatus as SubStatus
+from gradescope.tracing import span
+from gradescope.snapshot import Snapshot, take_snapshot, SYNC_ERRORS
+
+ASSIGNMENT_URL_FMT = 'https://www.gradescope.com/courses/{}/assignments/{}'
+
+def assignment_to_task(assgn: Assignment, course_shortname: str) -> GTask:
+
+    # process & transform time
+    # NOTE: <https://googleapis.github.io/google-api-python-client/docs/dyn/tasks_v1.tasks.html#insert>
+    # > The due date only records date information; the time portion
+    # > of the timestamp is discarded when setting the due date.
+    due = assgn.due_at
+    due = dt(due.year, due.month, due.day, 0, 0, 0, tzinfo=timezone.utc)
+    due = due.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    return {
+        'title': f'[{course_shortname}] {assgn.name}',
+        'due': due,
+        'status': 'needsAction' if assgn.submission_status == SubStatus.UNSUBMITTED else 'completed',
+        'notes': ASSIGNMENT_URL_FMT.format(assgn.cid, assgn.aid)
+    }
+
+def sync_tasks(gs: Gradescope,
+               make_client: t.Callable[[], GSTaskClient],
+               term: str, year: str,
+               include: t.Set[str] = None, exclude: t.Set[str] = None,
+               scheduler: PollScheduler = None,
+               max_workers: int = Gradescope.DEFAULT_MAX_WORKERS,
+               dry_run: bool = False,
+               pruner: TaskPruner = None) -> t.Dict[str, Exception]:
+    """
+    One sync cycle: scrape the selected courses (only those due when a scheduler
+    is given) and push their undue assignments to Google Tasks. The tasks client
+    is only built when there is something to sync. A dry run only logs the plan.
+    When a pruner is given and due, stale tasks are removed afterwards.
+    Returns the failed task keys.
+    """
+    snapshot = take_snapshot(gs, CourseFilter(term, year, include, exclude), scheduler, max_workers)
+    if not snapshot.polled:
+        return {}
+    return sync_snapshot(make_client(), snapshot, dry_run=dry_run, pruner=pruner)
+
+def sync_snapshot(client: GSTaskClient, snapshot: Snapshot,
+                  dry_run: bool = False, pruner: TaskPruner = None) -> t.Dict[str, Exception]:
+    """
+    Push the undue assignments of the courses polled for `snapshot` to Google
+    Tasks, deleting the tasks of assignments those courses no longer have.
+    Returns the failed task keys.
+    """
+    # only retain undue assignments
+    now = dt.now(timezone.utc)
+    assignments = list(filter(
+        lambda a: a.due_at is not None and now < a.due_at,
+            snapshot.assignments(polled_only=True)))
+
+    # convert course + assignment into task out here
+    tasks = defaultdict(GTask)
+    with span('assignment_to_task', assignments=len(assignments)):
+        for assignment in assignments:
+            key = assignment.cid + assignment.aid
+            tasks[key] = assignment_to_task(
+                assgn=assignment,
+                course_shortname=snapshot.courses[assignment.cid].shortname)
+
+    errors = client.update_tasks(tasks, scraped=snapshot.scraped, dry_run=dry_run)
+    log.info(f'Sync plan: {client.last_plan.counts()}')
+    if errors:
+        log.warning(f'Failed to sync {len(errors)} task(s): {sorted(errors)}')
+        SYNC_ERRORS.inc(len(errors), stage='tasks')
+
+    if pruner and pruner.due():
+        with span('prune_tasks'):
+            prune_errors = pruner.prune(client, selected_courses=set(snapshot.courses),
+                                        keep=set(tasks), dry_run=dry_run)
+        if prune_errors:
+            SYNC_ERRORS.inc(len(prune_errors), stage='tasks')
+            errors.update(prune_errors)
+    return errors
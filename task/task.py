@@ -1,20 +1,64 @@
-import re
 import os.path
 import typing as t
+from functools import lru_cache
 from collections import defaultdict
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import logging as log
 
 from gradescope.assignment import Assignment
-
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from gradescope.metrics import REGISTRY
+from gradescope.tracing import span
+from gradescope.rate_limit import TokenBucket
+from task.state import SyncStateStore
+from task.auth import TokenManager
+from task.reconcile import NOTES_PATTERN, Action, SyncPlan, plan_sync, task_ids
+
+# The Google client stack takes longer to import than the rest of the sync
+# together, so it is imported where first used: a cycle with nothing to sync
+# never loads it.
+
+# env override for the Tasks API discovery document, e.g. a copy pinned next to the code
+DISCOVERY_FILE_ENV = 'TASKS_DISCOVERY_FILE'
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'google_tasks_request_seconds', 'Duration of Google Tasks API requests.', ('method',))
+TASKS_SYNCED = REGISTRY.counter(
+    'google_tasks_synced', 'Synced tasks by outcome: inserted, patched, unchanged, deleted or failed.',
+    ('result',))
+SYNC_RESULTS = {
+    Action.INSERT: 'inserted',
+    Action.PATCH: 'patched',
+    Action.SKIP: 'unchanged',
+    Action.DELETE: 'deleted',
+}
+
+@lru_cache(maxsize=1)
+def discovery_document() -> t.Optional[str]:
+    """
+    The Tasks v1 discovery document, read once per process from
+    `TASKS_DISCOVERY_FILE` or the copy bundled with googleapiclient.
+    """
+    if (path := os.getenv(DISCOVERY_FILE_ENV)):
+        with open(path) as f:
+            return f.read()
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc('tasks', 'v1')
+
+def build_service(credentials):
+    """Tasks v1 service object, built without fetching the discovery document."""
+    from googleapiclient.discovery import build, build_from_document
+    if (document := discovery_document()) is None:
+        return build("tasks", "v1", credentials=credentials)
+    return build_from_document(document, credentials=credentials)
+
+def _http_error():
+    from googleapiclient.errors import HttpError
+    return HttpError
 
 
 class GTask:
+    __slots__ = ('completed', 'deleted', 'due', 'etag', 'hidden', 'tid', 'kind', 'links', 'notes',
+                 'parent', 'position', 'self_link', 'status', 'title', 'updated', 'webview_link')
 
     def __init__(
         self,
@@ -56,6 +100,8 @@ class GTask:
     def from_dict(cls, data: dict):
         return cls(
             tid=data.get('id'),
+            etag=data.get('etag'),
+            updated=data.get('updated'),
             title=data.get('title'),
             status=data.get('status'),
             due=data.get('due'),
@@ -75,6 +121,8 @@ class GTask:
 
 
 class GTasklist:
+    __slots__ = ('etag', 'lid', 'kind', 'self_link', 'title', 'updated')
+
     def __init__(self, etag=None, lid=None, kind=None, self_link=None, title=None, updated=None) -> None:
         self.etag = etag                # ETag of the resource.
         self.lid = lid                  # Type of the resource. This is always "tasks#taskList".
@@ -107,46 +155,72 @@ class GTasklist:
 
 class GSTaskClient:
 
-    NOTES_PATTERN = r"/courses/(\d+)/assignments/(\d+)"
+    NOTES_PATTERN = NOTES_PATTERN
     DEFAULT_TASKLIST_NAME = "gs_tasklist"
     SCOPES = ["https://www.googleapis.com/auth/tasks"]
+    BATCH_SIZE = 50     # mutations per batch request
+    WATERMARK_SKEW = timedelta(minutes=1)   # overlap between incremental refreshes
+    PAGE_SIZE = 100     # tasks per list page, the API maximum
+    TASK_FIELDS = 'items(id,title,status,due,notes,etag,updated,deleted),nextPageToken'
 
-    def __init__(self, client_secret_file, token_file, tasklist_name = None) -> None:
+    def __init__(self, client_secret_file, token_file, tasklist_name = None, state_file = None) -> None:
         self.token_file = token_file
         self.client_secret_file = client_secret_file
         self.tasklist_name = tasklist_name or self.DEFAULT_TASKLIST_NAME
 
-        self.credentials: Credentials = None
+        self.tokens = TokenManager(token_file, client_secret_file, self.SCOPES)
+        self.credentials = None     # google.oauth2.credentials.Credentials
         self.service = None
         self.gs_tasklist = None
 
         self.tasks_cache = defaultdict(GTask)
+        self.last_plan: SyncPlan = None     # plan of the latest update_tasks call
+
+        # optional local sync state, enables incremental refreshes of the cache
+        self.state = SyncStateStore(state_file) if state_file else None
     
     def authenticate(self):
-        
-        if os.path.exists(self.token_file):
-            self.credentials = Credentials.from_authorized_user_file(self.token_file, self.SCOPES)
-        
-        # If there are no (valid) credentials available, let the user log in.
-        if not self.credentials or not self.credentials.valid:
-            if self.credentials and self.credentials.expired and self.credentials.refresh_token:
-                self.credentials.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    self.client_secret_file, self.SCOPES)
-            
-                self.credentials = flow.run_local_server(bind_addr='0.0.0.0', open_browser=False)
-            # Save the credentials for the next run
-            with open(self.token_file, "w") as token:
-                token.write(self.credentials.to_json())
-        
-        self.service = build("tasks", "v1", credentials=self.credentials)
+        self.credentials = self.tokens.load()
+        self.service = build_service(self.credentials)
         log.info('Successfully authenticated.')
 
+    def refresh(self):
+        """
+        Start a later sync cycle on an initialized client: the service, its
+        connections and the tasklist are reused, only the cache is refreshed.
+        """
+        self.tokens.save()
+        try:
+            self.cache_tasks()
+        except _http_error() as e:
+            if e.resp.status != 404:
+                raise
+            log.info('Tasklist no longer exists, initiating it again.')
+            if self.state:
+                self.state.reset(self.gs_tasklist.lid)
+                self.state.set_tasklist_id(self.tasklist_name, None)
+            self.init_tasklist()
+
+    def close(self):
+        self.tokens.stop()
+
     def init_tasklist(self):
         self.gs_tasklist = None
         page_token = None
 
+        if self.state and (tasklist_id := self.state.get_tasklist_id(self.tasklist_name)):
+            self.gs_tasklist = GTasklist(lid=tasklist_id, title=self.tasklist_name)
+            try:
+                self.cache_tasks()
+                return
+            except _http_error() as e:
+                if e.resp.status != 404:
+                    raise
+                log.info('Stored tasklist no longer exists, searching tasklists.')
+                self.state.reset(tasklist_id)
+                self.state.set_tasklist_id(self.tasklist_name, None)
+                self.gs_tasklist = None
+
         while True:
             # Retrieve task lists with the current page token
             tasklists = self.service.tasklists().list(maxResults=100, pageToken=page_token).execute()
@@ -155,6 +229,8 @@ class GSTaskClient:
             for tasklist in tasklists.get('items', []):
                 if tasklist['title'] == self.tasklist_name:
                     self.gs_tasklist = GTasklist.from_dict(tasklist)
+                    if self.state:
+                        self.state.set_tasklist_id(self.tasklist_name, self.gs_tasklist.lid)
                     self.cache_tasks()
                     return
 
@@ -170,64 +246,201 @@ class GSTaskClient:
 
         if not self.gs_tasklist:
             raise Exception('Failed to initiate tasklist')
+        if self.state:
+            self.state.set_tasklist_id(self.tasklist_name, self.gs_tasklist.lid)
         log.info('Tasklist initiated.')
 
 
     def cache_tasks(self):
 
-        tasks = self.service.tasks().list(
-            tasklist=self.gs_tasklist.lid,
+        if self.state:
+            self._refresh_state()
+            self._log_cached()
+            return
+
+        # cache is filled page by page as the listing streams in
+        self.tasks_cache.clear()
+        for item in self.iter_tasks(
             showHidden=True,
             dueMin=datetime.now(timezone.utc).isoformat()
-        ).execute()
+        ):
+            if (ids := self._task_ids(item.get('notes'))):
+                course_id, assignment_id = ids
+                self.tasks_cache[course_id+assignment_id] = GTask.from_dict(item)
         
-        for item in tasks.get('items'):
-            if item['kind'] != 'tasks#task':
+        self._log_cached()
+
+    def iter_tasks(self, fields: str = None, **params) -> t.Iterator[dict]:
+        """
+        Yield the tasks of the tasklist, following `nextPageToken` and
+        requesting only the fields that are used (`TASK_FIELDS` by default).
+        """
+        page_token = None
+        while True:
+            with REQUEST_SECONDS.time(method='list'), span('tasks.list'):
+                page = self.service.tasks().list(
+                    tasklist=self.gs_tasklist.lid,
+                    maxResults=self.PAGE_SIZE,
+                    pageToken=page_token,
+                    fields=fields or self.TASK_FIELDS,
+                    **params
+                ).execute()
+
+            for item in page.get('items', []):
+                if item.get('kind', 'tasks#task') == 'tasks#task':
+                    yield item
+
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                break
+
+    def _refresh_state(self):
+        """
+        Bring the local sync state up to date with the tasks updated since the
+        previous refresh, then rebuild the cache from it.
+        """
+        tasklist_id = self.gs_tasklist.lid
+        updated_min = self.state.get_watermark(tasklist_id)
+        now = datetime.now(timezone.utc)
+
+        params = {'showHidden': True}
+        if updated_min:
+            params.update(updatedMin=updated_min, showDeleted=True)
+        else:
+            params.update(dueMin=now.isoformat())   # first refresh, full scan
+
+        for item in self.iter_tasks(**params):
+            if not (ids := self._task_ids(item.get('notes'))):
                 continue
+            if item.get('deleted'):
+                self.state.delete(*ids)
+            else:
+                self.state.upsert(*ids, item['id'], tasklist_id, item.get('etag'), item)
 
-            task = GTask.from_dict(item)
+        self.state.set_watermark(tasklist_id, (now - self.WATERMARK_SKEW).isoformat())
 
-            if task.notes:
-                matches = re.findall(self.NOTES_PATTERN, task.notes)
-                if matches:
-                    course_id, assignment_id = matches[0]
-                    self.tasks_cache[course_id+assignment_id] = task
-        
-        self._log_cached()
+        self.tasks_cache.clear()
+        for s in self.state.tasks(tasklist_id):
+            self.tasks_cache[s.key] = GTask(tid=s.task_id, etag=s.etag, **s.body)
+
+    def _task_ids(self, notes) -> t.Optional[t.Tuple[str, str]]:
+        """(course id, assignment id) referenced by the notes of a task."""
+        return task_ids(notes)
+
+    def _cache_task(self, key, item: dict):
+        self.tasks_cache[key] = GTask.from_dict(item)
+        if self.state and (ids := self._task_ids(item.get('notes'))):
+            self.state.upsert(*ids, item['id'], self.gs_tasklist.lid, item.get('etag'), item)
+
+    def _forget_task(self, key, item: dict = None):
+        task = self.tasks_cache.pop(key, None)
+        notes = task.notes if task else (item or {}).get('notes')
+        if self.state and (ids := self._task_ids(notes)):
+            self.state.delete(*ids)
 
     def insert_task(self, key, task_body):
         log.debug(f'Received request to insert task: key={key} task_body={task_body}')
 
-        t = self.service.tasks().insert(
-            tasklist=self.gs_tasklist.lid,
-            body=task_body,
-        ).execute()
+        with REQUEST_SECONDS.time(method='insert'), span('tasks.insert', key=key):
+            t = self.service.tasks().insert(
+                tasklist=self.gs_tasklist.lid,
+                body=task_body,
+            ).execute()
 
-        task = GTask.from_dict(t)
-        self.tasks_cache[key] = task    # update cache with added task
+        self._cache_task(key, t)    # update cache with added task
         self._log_cached()
 
     def patch_task(self, key, task_id, task_body):
         log.debug(f'Received request to patch task: key={key} task_body={task_body}')
 
-        t = self.service.tasks().patch(
-            tasklist=self.gs_tasklist.lid,
-            task=task_id,
-            body=task_body,
-        ).execute()
+        with REQUEST_SECONDS.time(method='patch'), span('tasks.patch', key=key):
+            t = self.service.tasks().patch(
+                tasklist=self.gs_tasklist.lid,
+                task=task_id,
+                body=task_body,
+            ).execute()
 
-        task = GTask.from_dict(t)
-        self.tasks_cache[key] = task    # update cache with patched task
+        self._cache_task(key, t)    # update cache with patched task
         self._log_cached()
 
-    def update_tasks(self, updated_tasks: t.Dict[str, GTask]):
-
-        for key in updated_tasks:
-            if key not in self.tasks_cache:
-                self.insert_task(key, updated_tasks[key])   # insert task
-            elif self.tasks_cache[key].to_dict() != updated_tasks[key]:
-                task_id = self.tasks_cache[key].tid
-                self.patch_task(key, task_id, updated_tasks[key])   # patch task
+    def plan_updates(self, updated_tasks: t.Dict[str, dict],
+                     scraped: t.Dict[str, t.Set[str]] = None) -> SyncPlan:
+        """
+        Plan the inserts, patches and deletes that bring the cached tasklist in
+        line with `updated_tasks`; see `plan_sync` for `scraped`.
+        """
+        existing = {key: task.to_dict() for key, task in self.tasks_cache.items()}
+        return plan_sync(updated_tasks, existing, lambda key: self.tasks_cache[key].tid, scraped)
+
+    def update_tasks(self, updated_tasks: t.Dict[str, dict],
+                     scraped: t.Dict[str, t.Set[str]] = None,
+                     dry_run: bool = False) -> t.Dict[str, Exception]:
+        """
+        Plan and apply the changes for `updated_tasks`, sent as batch requests.
+        A dry run only logs the plan. The plan is kept in `last_plan`.
+        Returns the errors of the mutations that failed, keyed by task key.
+        """
+        plan = self.last_plan = self.plan_updates(updated_tasks, scraped)
+        if dry_run:
+            log.info(f'Dry run, planned changes: {plan.format()}')
+            return {}
+        return self.apply_plan(plan)
+
+    def apply_plan(self, plan: SyncPlan, rate_limit: TokenBucket = None) -> t.Dict[str, Exception]:
+        """
+        Send the writes of `plan` as batch requests, each batch taking a token
+        from `rate_limit` when given. Returns the errors keyed by task key.
+        """
+        mutations = []
+        for change in plan.writes:
+            log.debug(f'Planned {change.action.value}: key={change.key} reason={change.reason} '
+                      f'task_body={change.body}')
+            if change.action == Action.INSERT:
+                request = self.service.tasks().insert(tasklist=self.gs_tasklist.lid, body=change.body)
+            elif change.action == Action.PATCH:
+                request = self.service.tasks().patch(
+                    tasklist=self.gs_tasklist.lid, task=change.task_id, body=change.body)
+            else:
+                request = self.service.tasks().delete(tasklist=self.gs_tasklist.lid, task=change.task_id)
+            mutations.append((change, request))
+
+        errors = self._execute_batched(mutations, rate_limit)
+        if mutations:
+            self._log_cached()
+
+        for change in plan.changes:
+            TASKS_SYNCED.inc(result='failed' if change.key in errors else SYNC_RESULTS[change.action])
+        return errors
+
+    def _execute_batched(self, mutations, rate_limit: TokenBucket = None) -> t.Dict[str, Exception]:
+        errors = {}
+        changes = {change.key: change for change, _ in mutations}
+
+        def callback(key, response, exception):
+            if exception is not None:
+                log.error(f'Failed to update task: key={key} error={exception}')
+                errors[key] = exception
+            elif changes[key].action == Action.DELETE:
+                self._forget_task(key, changes[key].body)
+            else:
+                self._cache_task(key, response)    # update cache with result
+
+        for i in range(0, len(mutations), self.BATCH_SIZE):
+            chunk = mutations[i:i + self.BATCH_SIZE]
+            if rate_limit:
+                rate_limit.acquire()
+            batch = self.service.new_batch_http_request(callback=callback)
+            for change, request in chunk:
+                batch.add(request, request_id=change.key)
+            try:
+                with REQUEST_SECONDS.time(method='batch'), span('tasks.batch', size=len(chunk)):
+                    batch.execute()
+            except _http_error() as e:
+                # the whole batch was rejected, keep going with the next chunk
+                log.error(f'Failed to execute batch: error={e}')
+                for change, _ in chunk:
+                    errors.setdefault(change.key, e)
+        return errors
 
     # log cached task
     def _log_cached(self):
@@ -238,3 +451,29 @@ class GSTaskClient:
                 log.debug(f'\ttask {i + 1}: key={id} task_id={task.tid} title={task.title}')
             else:
                 log.debug(f'\ttask {i + 1}: key={id} task_id={task.get("id")} title={task.get("title")}')
+
+
+class PersistentTaskClient:
+    """
+    One GSTaskClient kept across sync cycles, usable as the `make_client` of
+    `sync_tasks`. The first call builds, authenticates and initializes it and
+    starts the background token refresh; later calls only refresh its cache.
+    """
+
+    def __init__(self, make_client: t.Callable[[], GSTaskClient]) -> None:
+        self.make_client = make_client
+        self.client: t.Optional[GSTaskClient] = None
+
+    def __call__(self) -> GSTaskClient:
+        if self.client is None:
+            client = self.make_client()
+            client.tokens.start()
+            self.client = client
+        else:
+            self.client.refresh()
+        return self.client
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None